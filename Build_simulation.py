@@ -1,76 +1,65 @@
-import pandas as pd
-import numpy as np
-import math
-from skfuzzy import control as ctrl
-from define_fuzzy_variables import fuzzy_variables
-from define_fuzzy_rules import rules
+import instrumentation
+from compiled_model import load_or_compile, source_hash
+from score_cache import QuantizedScoreCache
+from session_stream import stream_session, score_aligned_session
 
-obd_df = pd.read_csv("safe_riding.csv")
-sensor_df = pd.read_csv("20250601_142500_imu.csv")
+# Set to e.g. "Result/score_cache.npz" to memoize scores on quantized inputs
+# across runs (see score_cache.DEFAULT_RESOLUTION for the step per input)
+SCORE_CACHE_FILE = None
 
-sensor_df["lean"] = np.degrees(np.arctan2(sensor_df["accel_x"], sensor_df["accel_z"])).abs()
+# Rows per chunk; bounds peak memory independently of session length
+CHUNK_SIZE = 10000
 
-min_len = min(len(obd_df), len(sensor_df))
-obd_df = obd_df.iloc[:min_len].reset_index(drop=True)
-sensor_df = sensor_df.iloc[:min_len].reset_index(drop=True)
-obd_df["lean"] = sensor_df["lean"]
+# The extension picks the format: .csv (default), or .parquet / .feather for a
+# typed, compressed columnar file (needs pyarrow). The inputs may be
+# converted the same way with columnar_io.py.
+RESULT_FILE = "Result/fuzzy_results_real_lean_safe.csv"
 
-df = obd_df[['Vehicle speed (km/h)', 'Engine RPM (rpm)', 'Calculated engine load value (%)',
-             'Relative throttle position (%)', 'Instant engine power (based on fuel consumption) (hp)',
-             'Intake manifold absolute pressure (psi)', 'lean']].copy()
+# "index" pairs OBD row i with IMU row i (streamed). "obd" / "imu" align the
+# logs on their timestamps and score at that stream's rate; lean is reduced
+# per OBD interval with ALIGN_HOW (see time_alignment.py)
+ALIGNMENT = "index"
+ALIGN_HOW = "max"
 
-speed = fuzzy_variables['speed']
-rpm = fuzzy_variables['rpm']
-acceleration = fuzzy_variables['acceleration']
-throttle = fuzzy_variables['throttle']
-power = fuzzy_variables['power']
-intake_pressure = fuzzy_variables['intake_pressure']
-lean = fuzzy_variables['lean']
-safety = fuzzy_variables['safety']
-system = ctrl.ControlSystem(rules)
+# "accel" is the accelerometer-only lean, abs(degrees(arctan2(accel_x, accel_z))).
+# "fusion" blends in gyro_y with a complementary filter (lean_estimator.py),
+# which holds up better under cornering load; the lean MFs and rules are unchanged
+LEAN_METHOD = "accel"
 
-scores = []
-labels = []
+# Set to e.g. "Result/metrics.prom" (Prometheus text) or "Result/metrics.json"
+# to record per-stage timings, row counts, "No Result" causes and the mean
+# per-row scoring latency (see instrumentation.py). Off by default.
+METRICS_FILE = None
+if METRICS_FILE:
+    instrumentation.enable()
 
-for i, row in df.iterrows():
-    try:
-        sim = ctrl.ControlSystemSimulation(system)
-        sim.input['speed'] = row['Vehicle speed (km/h)']
-        sim.input['rpm'] = row['Engine RPM (rpm)']
-        sim.input['acceleration'] = row['Calculated engine load value (%)']
-        sim.input['throttle'] = row['Relative throttle position (%)']
-        sim.input['power'] = row['Instant engine power (based on fuel consumption) (hp)']
-        sim.input['intake_pressure'] = row['Intake manifold absolute pressure (psi)']
-        sim.input['lean'] = row['lean']
-        sim.compute()
+# Whole session in vectorized chunks (matches ControlSystemSimulation to
+# within batch_inference.SKFUZZY_TOLERANCE). The rule base is compiled once
+# into fuzzy_model.npz and reloaded on later runs.
+with instrumentation.stage("model_load"):
+    engine = load_or_compile()
+if SCORE_CACHE_FILE:
+    engine = QuantizedScoreCache(engine, path=SCORE_CACHE_FILE, tag=source_hash())
 
-        score = round(sim.output['safety'])
-        scores.append(score)
+if ALIGNMENT == "index":
+    summary = stream_session(engine, "safe_riding.csv", "20250601_142500_imu.csv",
+                             RESULT_FILE, chunk_size=CHUNK_SIZE,
+                             lean_method=LEAN_METHOD)
+else:
+    summary = score_aligned_session(engine, "safe_riding.csv", "20250601_142500_imu.csv",
+                                    RESULT_FILE, rate=ALIGNMENT, how=ALIGN_HOW,
+                                    lean_method=LEAN_METHOD)
+if SCORE_CACHE_FILE:
+    engine.save()
+    print(f"Score cache: {engine.stats()}")
 
-        if score <= 3:
-            label = "Safe"
-        elif score <= 5:
-            label = "Moderately Safe"
-        elif score <= 7:
-            label = "Unsafe"
-        else:
-            label = "Highly Unsafe"
-        labels.append(label)
-
-    except Exception as e:
-        scores.append(None)
-        labels.append("No Result")
-
-df['Safety Score'] = scores
-df['Safety Label'] = labels
-df.to_csv("Result/fuzzy_results_real_lean_safe.csv", index=False)
-
-valid_scores = [s for s in scores if s is not None]
-mean_score = round(np.mean(valid_scores), 2)
-percent_unsafe = 100 * sum(l in ["Unsafe", "Highly Unsafe"] for l in labels) / len(labels)
+mean_score = summary.mean_score
+percent_unsafe = summary.percent_unsafe
 
 print("Fuzzy safety simulation complete.")
 print(f"- Mean Safety Score: {mean_score}")
-print(f"- Session Rating: {'Safe' if mean_score <= 3 else 'Moderately Safe' if mean_score <= 5 else 'Unsafe' if mean_score <= 7 else 'Highly Unsafe'}")
+print(f"- Session Rating: {summary.rating}")
 print(f"- {percent_unsafe:.1f}% of entries marked Unsafe or Highly Unsafe.")
 print("Results saved to: fuzzy_results_real_lean.csv")
+if METRICS_FILE:
+    print(f"Metrics saved to: {instrumentation.write(METRICS_FILE)}")
@@ -0,0 +1,313 @@
+import numpy as np
+from instrumentation import stage
+
+INPUT_VARIABLES = ['speed', 'rpm', 'acceleration', 'throttle', 'power', 'intake_pressure', 'lean']
+
+INPUT_COLUMNS = {
+    'speed': 'Vehicle speed (km/h)',
+    'rpm': 'Engine RPM (rpm)',
+    'acceleration': 'Calculated engine load value (%)',
+    'throttle': 'Relative throttle position (%)',
+    'power': 'Instant engine power (based on fuel consumption) (hp)',
+    'intake_pressure': 'Intake manifold absolute pressure (psi)',
+    'lean': 'lean'
+}
+
+# Bound on |batch - ControlSystemSimulation| (worst case seen on safe_riding.csv,
+# aggressive_riding.csv and uniform random inputs is ~0.022). The skfuzzy path
+# inserts extra points where each output term crosses its cut level; the batch
+# path integrates on the fixed consequent universe, hence the small difference.
+SKFUZZY_TOLERANCE = 0.05
+
+OP_TERM, OP_AND, OP_OR, OP_NOT = 0, 1, 2, 3
+
+MODES = ('grid', 'analytic')
+
+
+def safety_label(score):
+    if score is None:
+        return "No Result"
+    if score <= 3:
+        return "Safe"
+    elif score <= 5:
+        return "Moderately Safe"
+    elif score <= 7:
+        return "Unsafe"
+    return "Highly Unsafe"
+
+
+def _compile_antecedent(node, var_index, term_index, program):
+    # Post-order walk of skfuzzy's Term / TermAggregate tree
+    kind = getattr(node, 'kind', None)
+    if kind is None:
+        v = var_index[node.parent.label]
+        program.append((OP_TERM, v, term_index[v][node.label]))
+    elif kind == 'not':
+        _compile_antecedent(node.term1, var_index, term_index, program)
+        program.append((OP_NOT, 0, 0))
+    else:
+        _compile_antecedent(node.term1, var_index, term_index, program)
+        _compile_antecedent(node.term2, var_index, term_index, program)
+        program.append((OP_AND if kind == 'and' else OP_OR, 0, 0))
+
+
+def _trimf(x, a, b, c):
+    # skfuzzy.trimf evaluated at arbitrary points; NaN in, NaN out
+    y = np.zeros_like(x)
+    if a != b:
+        idx = (a < x) & (x < b)
+        y[idx] = (x[idx] - a) / (b - a)
+    if b != c:
+        idx = (b < x) & (x < c)
+        y[idx] = (c - x[idx]) / (c - b)
+    y[x == b] = 1.0
+    y[np.isnan(x)] = np.nan
+    return y
+
+
+def _edge_lines(params):
+    # Non-vertical triangle edges as (slope, intercept, term)
+    lines = []
+    for k, (a, b, c) in enumerate(params):
+        if b > a:
+            lines.append((1.0 / (b - a), -a / (b - a), k))
+        if c > b:
+            lines.append((-1.0 / (c - b), c / (c - b), k))
+    return lines
+
+
+def _fixed_breakpoints(params, lo, hi):
+    # Kinks of max_k min(cut_k, tri_k) that do not depend on the cuts:
+    # universe bounds, triangle vertices and edge/edge crossings of
+    # different terms. Vertical edges get a point just outside them so the
+    # jump is integrated as a step, not a ramp.
+    points = [lo, hi]
+    for a, b, c in params:
+        points += [a, b, c]
+        if a == b:
+            points.append(np.nextafter(a, -np.inf))
+        if b == c:
+            points.append(np.nextafter(c, np.inf))
+    lines = _edge_lines(params)
+    for i, (m1, q1, k1) in enumerate(lines):
+        for m2, q2, k2 in lines[i + 1:]:
+            if k1 != k2 and m1 != m2:
+                points.append((q2 - q1) / (m1 - m2))
+    return np.clip(np.array(points, dtype=float), lo, hi)
+
+
+def _analytic_centroid(params, lo, hi, fixed, cuts):
+    # Closed-form centroid of the clipped-triangle aggregate. Between two
+    # consecutive breakpoints the aggregate is linear, so evaluating it at the
+    # breakpoints and integrating segment by segment is exact. The cut
+    # dependent breakpoints are where every edge meets every cut level.
+    n = cuts.shape[1]
+    moving = []
+    for a, b, c in params:
+        for cut in cuts:
+            if b > a:
+                moving.append(a + cut * (b - a))
+            if c > b:
+                moving.append(c - cut * (c - b))
+    x = np.concatenate([np.broadcast_to(fixed, (n, len(fixed))),
+                        np.clip(np.array(moving).T, lo, hi)], axis=1)
+    x.sort(axis=1)
+
+    agg = np.zeros_like(x)
+    for k, (a, b, c) in enumerate(params):
+        np.maximum(agg, np.minimum(cuts[k][:, None], _trimf(x, a, b, c)), out=agg)
+
+    x1, x2 = x[:, :-1], x[:, 1:]
+    y1, y2 = agg[:, :-1], agg[:, 1:]
+    dx = x2 - x1
+    area = (dx * (y1 + y2) / 2.0).sum(axis=1)
+    moment = (dx * (x1 * (2 * y1 + y2) + x2 * (y1 + 2 * y2)) / 6.0).sum(axis=1)
+    valid = area > 0
+    out = np.full(n, np.nan)
+    out[valid] = moment[valid] / area[valid]
+    return out, valid
+
+
+def _centroid(universe, agg):
+    # Exact centroid of the piecewise-linear aggregate, row-wise (same
+    # trapezoid decomposition skfuzzy.defuzz uses for 'centroid')
+    x1, x2 = universe[:-1], universe[1:]
+    y1, y2 = agg[:, :-1], agg[:, 1:]
+    dx = x2 - x1
+    area = dx * (y1 + y2) / 2.0
+    moment = dx * (x1 * (2 * y1 + y2) + x2 * (y1 + 2 * y2)) / 6.0
+    total = area.sum(axis=1)
+    valid = total > 0
+    out = np.full(len(agg), np.nan)
+    out[valid] = moment.sum(axis=1)[valid] / total[valid]
+    return out, valid
+
+
+class FuzzyBatchEngine:
+    def __init__(self, variables, output, rules, mf_parameters=None, mode='grid', chunk_size=8192):
+        # variables:     [(name, universe, [labels], mfs (k x n))] in input column order
+        # output:        (name, universe, [labels], mfs (k x n))
+        # rules:         [(postfix program, [(output term index, weight)])]
+        # mf_parameters: optional {name: (k x 3) trimf [a, b, c] in label order},
+        #                required for every variable by mode='analytic'
+        self.variables = [(name, np.asarray(u, dtype=float), list(labels), np.asarray(mfs, dtype=float))
+                          for name, u, labels, mfs in variables]
+        name, u, labels, mfs = output
+        self.output = (name, np.asarray(u, dtype=float), list(labels), np.asarray(mfs, dtype=float))
+        self.rules = [(list(program), list(consequent)) for program, consequent in rules]
+        self.mf_parameters = None
+        if mf_parameters is not None:
+            self.mf_parameters = {k: np.asarray(v, dtype=float).reshape(-1, 3) for k, v in mf_parameters.items()}
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self._breakpoints = None
+        self._check_mode(mode)
+
+    def _check_mode(self, mode):
+        if mode not in MODES:
+            raise ValueError(f"Unknown inference mode '{mode}', expected one of {MODES}")
+        if mode == 'analytic':
+            names = self.input_names + [self.output[0]]
+            if self.mf_parameters is None or any(n not in self.mf_parameters for n in names):
+                raise ValueError("Analytic mode needs trimf parameters for every variable")
+
+    @property
+    def input_names(self):
+        return [v[0] for v in self.variables]
+
+    @classmethod
+    def from_skfuzzy(cls, fuzzy_variables, rules, input_names=INPUT_VARIABLES, output_name='safety',
+                     mf_parameters=None, **kwargs):
+        variables = []
+        for name in input_names:
+            var = fuzzy_variables[name]
+            labels = list(var.terms.keys())
+            variables.append((name, var.universe, labels, [var.terms[t].mf for t in labels]))
+
+        out_var = fuzzy_variables[output_name]
+        if out_var.defuzzify_method != 'centroid':
+            raise ValueError(f"Unsupported defuzzify method: {out_var.defuzzify_method}")
+        out_labels = list(out_var.terms.keys())
+        output = (output_name, out_var.universe, out_labels, [out_var.terms[t].mf for t in out_labels])
+
+        var_index = {name: i for i, name in enumerate(input_names)}
+        term_index = [{label: j for j, label in enumerate(v[2])} for v in variables]
+        out_index = {label: j for j, label in enumerate(out_labels)}
+
+        compiled = []
+        for rule in rules:
+            program = []
+            _compile_antecedent(rule.antecedent, var_index, term_index, program)
+            consequent = []
+            for wt in rule.consequent:
+                if wt.term.parent.label != output_name:
+                    raise ValueError(f"Rule consequent is not on '{output_name}': {rule}")
+                consequent.append((out_index[wt.term.label], float(wt.weight)))
+            compiled.append((program, consequent))
+
+        params = None
+        if mf_parameters is not None:
+            params = {name: [mf_parameters[name][label] for label in labels]
+                      for name, _, labels, _ in variables + [output]}
+        return cls(variables, output, compiled, mf_parameters=params, **kwargs)
+
+    def fuzzify(self, X):
+        # Returns one (k x N) membership array per input. Inputs are clipped to
+        # the universe like ControlSystemSimulation does; NaN stays NaN.
+        memberships = []
+        for i, (_, universe, _, mfs) in enumerate(self.variables):
+            x = np.clip(X[:, i], universe[0], universe[-1])
+            memberships.append(np.array([np.interp(x, universe, mf, left=0.0, right=0.0) for mf in mfs]))
+        return memberships
+
+    def fuzzify_analytic(self, X):
+        # Exact trimf at the raw (clipped) input instead of interpolating the
+        # sampled MF
+        memberships = []
+        for i, (name, universe, _, _) in enumerate(self.variables):
+            x = np.clip(X[:, i], universe[0], universe[-1])
+            memberships.append(np.array([_trimf(x, a, b, c) for a, b, c in self.mf_parameters[name]]))
+        return memberships
+
+    def rule_strengths(self, memberships, n):
+        # Antecedent strength of every rule, (rules x N). fmin / fmax, so a
+        # missing (NaN) input drops out of an AND / OR exactly as it does in
+        # skfuzzy; a rule whose inputs are all missing stays NaN.
+        strengths = np.empty((len(self.rules), n))
+        for r, (program, _) in enumerate(self.rules):
+            stack = []
+            for op, v, t in program:
+                if op == OP_TERM:
+                    stack.append(memberships[v][t])
+                elif op == OP_NOT:
+                    stack.append(1.0 - stack.pop())
+                else:
+                    b, a = stack.pop(), stack.pop()
+                    stack.append(np.fmin(a, b) if op == OP_AND else np.fmax(a, b))
+            strengths[r] = stack.pop()
+        return strengths
+
+    def accumulate(self, strengths, consequents=None):
+        # Per-output-term cuts from rule strengths; `consequents` overrides the
+        # rule base's [(output term index, weight)] lists
+        consequents = consequents or [c for _, c in self.rules]
+        cuts = np.full((len(self.output[3]), strengths.shape[1]), np.nan)
+        for strength, consequent in zip(strengths, consequents):
+            for k, weight in consequent:
+                np.fmax(cuts[k], strength * weight, out=cuts[k])
+        return np.nan_to_num(cuts, nan=0.0)
+
+    def fire(self, memberships, n):
+        # Returns per-output-term cuts
+        return self.accumulate(self.rule_strengths(memberships, n))
+
+    def defuzzify(self, cuts):
+        _, universe, _, out_mfs = self.output
+        agg = np.zeros((cuts.shape[1], len(universe)))
+        for k, mf in enumerate(out_mfs):
+            np.maximum(agg, np.minimum(cuts[k][:, None], mf[None, :]), out=agg)
+        return _centroid(universe, agg)
+
+    def defuzzify_analytic(self, cuts):
+        name, universe, _, _ = self.output
+        params = self.mf_parameters[name]
+        if self._breakpoints is None:
+            self._breakpoints = _fixed_breakpoints(params, universe[0], universe[-1])
+        return _analytic_centroid(params, universe[0], universe[-1], self._breakpoints, cuts)
+
+    def score(self, X, mode=None):
+        # X: (N x len(input_names)) array in input_names order.
+        # Returns (scores, valid); invalid rows (nothing fired, or every input
+        # missing) come back as NaN instead of raising.
+        # mode='grid' follows skfuzzy's sampled MFs and consequent universe;
+        # mode='analytic' uses the exact triangles, O(rules) per sample.
+        mode = mode or self.mode
+        self._check_mode(mode)
+        X = np.asarray(X, dtype=float)
+        if X.ndim != 2 or X.shape[1] != len(self.variables):
+            raise ValueError(f"Expected an (N x {len(self.variables)}) array, got {X.shape}")
+
+        if mode == 'analytic':
+            fuzzify, defuzzify = self.fuzzify_analytic, self.defuzzify_analytic
+        else:
+            fuzzify, defuzzify = self.fuzzify, self.defuzzify
+
+        scores = np.full(len(X), np.nan)
+        valid = np.zeros(len(X), dtype=bool)
+        for start in range(0, len(X), self.chunk_size):
+            chunk = X[start:start + self.chunk_size]
+            with stage("fuzzify"):
+                memberships = fuzzify(chunk)
+            with stage("rules"):
+                cuts = self.fire(memberships, len(chunk))
+            with stage("defuzzify"):
+                s, ok = defuzzify(cuts)
+            missing = np.isnan(chunk).all(axis=1)
+            ok &= ~missing
+            scores[start:start + len(chunk)] = np.where(ok, s, np.nan)
+            valid[start:start + len(chunk)] = ok
+        return scores, valid
+
+    def score_frame(self, df, columns=INPUT_COLUMNS, mode=None):
+        X = df[[columns[name] for name in self.input_names]].to_numpy(dtype=float)
+        return self.score(X, mode=mode)
@@ -0,0 +1,269 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+from batch_inference import OP_AND, OP_TERM, FuzzyBatchEngine, INPUT_VARIABLES, _trimf
+from compare_inference import load_session, synthetic_inputs, timed
+from compiled_model import load_or_compile
+
+BENCHMARK_FORMAT_VERSION = 1
+CASES = ['skfuzzy_latency', 'sparse_latency', 'batch_throughput', 'rule_scaling', 'universe_resolution',
+         'imu_ingest']
+
+# Sizes per case; --quick uses the second set
+FULL = {'latency_samples': 500, 'rows': [100, 1000, 10000, 100000], 'scaling_rows': 20000,
+        'rule_counts': [43, 100, 200, 400, 800], 'resolutions': [100, 200, 500, 1000, 2000],
+        'imu_samples': 5000, 'repeat': 3}
+QUICK = {'latency_samples': 100, 'rows': [100, 1000, 10000], 'scaling_rows': 5000,
+         'rule_counts': [43, 200], 'resolutions': [100, 500], 'imu_samples': 1000, 'repeat': 2}
+
+# Metric name suffix -> which direction is better, for compare()
+HIGHER_IS_BETTER = ('_per_s',)
+LOWER_IS_BETTER = ('_us', '_ms')
+
+
+def latency_summary(samples_s):
+    us = np.asarray(samples_s) * 1e6
+    return {'samples': len(us), 'mean_us': float(us.mean()), 'p50_us': float(np.percentile(us, 50)),
+            'p95_us': float(np.percentile(us, 95)), 'p99_us': float(np.percentile(us, 99)),
+            'max_us': float(us.max())}
+
+
+def bench_skfuzzy_latency(X):
+    # One ControlSystemSimulation per row, as the original Build_simulation.py
+    # loop did; the ControlSystem itself is built once outside the timing
+    from skfuzzy import control as ctrl
+    with contextlib.redirect_stdout(io.StringIO()):
+        from define_fuzzy_rules import rules
+    system = ctrl.ControlSystem(rules)
+    times = []
+    for row in X:
+        start = time.perf_counter()
+        try:
+            sim = ctrl.ControlSystemSimulation(system)
+            for name, value in zip(INPUT_VARIABLES, row):
+                sim.input[name] = value
+            sim.compute()
+            sim.output['safety']
+        except Exception:
+            pass
+        times.append(time.perf_counter() - start)
+    return latency_summary(times)
+
+
+def bench_sparse_latency(engine, X):
+    # Per-sample path used by live_scoring.py
+    from sparse_scorer import SparseScorer
+    scorer = SparseScorer(engine)
+    times = []
+    for row in X:
+        start = time.perf_counter()
+        scorer.score(row)
+        times.append(time.perf_counter() - start)
+    return latency_summary(times)
+
+
+def throughput(engine, X, repeat):
+    result = {}
+    for mode in ('grid', 'analytic'):
+        _, best = timed(lambda: engine.score(X, mode=mode), repeat)
+        result[f'{mode}_rows_per_s'] = len(X) / best
+    return result
+
+
+def bench_batch_throughput(engine, rows, repeat, seed=0):
+    return {str(n): throughput(engine, synthetic_inputs(engine, n, seed), repeat) for n in rows}
+
+
+def generated_rules(engine, count, seed=0):
+    # The real rule base plus random 2-3 input AND rules up to `count`
+    rng = np.random.default_rng(seed)
+    rules = list(engine.rules)
+    n_terms = len(engine.output[2])
+    while len(rules) < count:
+        program = []
+        for i, v in enumerate(rng.choice(len(engine.variables), size=rng.integers(2, 4), replace=False)):
+            program.append((OP_TERM, int(v), int(rng.integers(len(engine.variables[v][2])))))
+            if i:
+                program.append((OP_AND, 0, 0))
+        rules.append((program, [(int(rng.integers(n_terms)), 1.0)]))
+    return rules[:count]
+
+
+def bench_rule_scaling(engine, counts, rows, repeat, seed=0):
+    X = synthetic_inputs(engine, rows, seed)
+    result = {}
+    for count in counts:
+        scaled = FuzzyBatchEngine(engine.variables, engine.output, generated_rules(engine, count, seed),
+                                  mf_parameters=engine.mf_parameters)
+        result[str(count)] = throughput(scaled, X, repeat)
+    return result
+
+
+def resampled_engine(engine, points):
+    # Same trimfs and rules sampled on `points`-point universes
+    def resample(name, universe, labels):
+        u = np.linspace(universe[0], universe[-1], points)
+        return name, u, labels, np.array([_trimf(u, a, b, c) for a, b, c in engine.mf_parameters[name]])
+    variables = [resample(name, u, labels) for name, u, labels, _ in engine.variables]
+    output = resample(*engine.output[:3])
+    return FuzzyBatchEngine(variables, output, engine.rules, mf_parameters=engine.mf_parameters)
+
+
+def bench_universe_resolution(engine, resolutions, rows, repeat, seed=0):
+    X = synthetic_inputs(engine, rows, seed)
+    result = {}
+    for points in resolutions:
+        resampled = resampled_engine(engine, points)
+        _, best = timed(lambda: resampled.score(X, mode='grid'), repeat)
+        result[str(points)] = {'grid_rows_per_s': rows / best}
+    # Exact triangles do not depend on the sampling; reference point
+    _, best = timed(lambda: engine.score(X, mode='analytic'), repeat)
+    result['analytic'] = {'analytic_rows_per_s': rows / best}
+    return result
+
+
+def bench_imu_ingest(samples, seed=0):
+    # imu.main_Call's logging loop against FakeSMBus, unthrottled, for both
+    # log formats. Runs in a scratch directory (main_Call writes ./imu/).
+    from fake_smbus import FakeSMBus
+    import imu
+    rng = np.random.default_rng(seed)
+    raw = rng.integers(-16000, 16000, size=(256, 7)).tolist()
+    result = {}
+    cwd = os.getcwd()
+    for log_format in ('csv', 'bin'):
+        bus = FakeSMBus.from_raw(raw)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                os.makedirs("imu")
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    status = imu.main_Call(rate_hz=1e9, bus=bus, max_samples=samples, log_format=log_format,
+                                           echo_every=0)
+                elapsed = time.perf_counter() - start
+            finally:
+                os.chdir(cwd)
+        result[log_format] = {'samples_per_s': samples / elapsed, 'sample_us': 1e6 * elapsed / samples,
+                              'bus_transactions_per_sample': (bus.transactions - 1) / samples,
+                              'status': status['status']}
+    return result
+
+
+def environment():
+    import pandas
+    info = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pandas.__version__,
+            'platform': platform.platform(), 'machine': platform.machine(), 'cpus': os.cpu_count()}
+    try:
+        import skfuzzy
+        info['skfuzzy'] = skfuzzy.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def run(cases=CASES, quick=False, seed=0, log=print):
+    sizes = QUICK if quick else FULL
+    engine = load_or_compile()
+    results = {}
+    for case in cases:
+        log(f"Running {case}...")
+        if case == 'skfuzzy_latency':
+            X = load_session("safe_riding.csv")[:sizes['latency_samples']]
+            results[case] = bench_skfuzzy_latency(X)
+        elif case == 'sparse_latency':
+            results[case] = bench_sparse_latency(engine, synthetic_inputs(engine, sizes['latency_samples'], seed))
+        elif case == 'batch_throughput':
+            results[case] = bench_batch_throughput(engine, sizes['rows'], sizes['repeat'], seed)
+        elif case == 'rule_scaling':
+            results[case] = bench_rule_scaling(engine, sizes['rule_counts'], sizes['scaling_rows'],
+                                               sizes['repeat'], seed)
+        elif case == 'universe_resolution':
+            results[case] = bench_universe_resolution(engine, sizes['resolutions'], sizes['scaling_rows'],
+                                                      sizes['repeat'], seed)
+        elif case == 'imu_ingest':
+            results[case] = bench_imu_ingest(sizes['imu_samples'], seed)
+        else:
+            raise ValueError(f"Unknown benchmark case '{case}', expected one of {CASES}")
+    return {'version': BENCHMARK_FORMAT_VERSION, 'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': environment(), 'config': {'quick': quick, 'seed': seed, **sizes},
+            'results': results}
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)):
+            flat[path] = value
+    return flat
+
+
+def compare(baseline, current, threshold=0.15):
+    # Relative change of every timing metric present in both runs. A metric
+    # regresses when it moves more than `threshold` in the worse direction.
+    base, cur = flatten(baseline['results']), flatten(current['results'])
+    rows = []
+    for path in sorted(set(base) & set(cur)):
+        if path.endswith(HIGHER_IS_BETTER):
+            sign = 1
+        elif path.endswith(LOWER_IS_BETTER):
+            sign = -1
+        else:
+            continue
+        if base[path] == 0:
+            continue
+        change = (cur[path] - base[path]) / base[path]
+        rows.append({'metric': path, 'baseline': base[path], 'current': cur[path], 'change': change,
+                     'regression': sign * change < -threshold, 'improvement': sign * change > threshold})
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"{'metric':<58}{'baseline':>14}{'current':>14}{'change':>9}")
+    for r in rows:
+        flag = "  REGRESSION" if r['regression'] else "  improved" if r['improvement'] else ""
+        print(f"{r['metric']:<58}{r['baseline']:>14.4g}{r['current']:>14.4g}{100 * r['change']:>8.1f}%{flag}")
+    regressions = sum(r['regression'] for r in rows)
+    print(f"{regressions} regression(s) beyond {100 * threshold:.0f}% in {len(rows)} metrics.")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inference, scaling and IMU ingest benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="run the benchmarks and write JSON")
+    run_parser.add_argument("--cases", nargs="+", default=CASES, choices=CASES)
+    run_parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast smoke run")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--out", default="Result/benchmark.json")
+    compare_parser = sub.add_parser("compare", help="flag regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="relative change, e.g. 0.15")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args.cases, args.quick, args.seed)
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Benchmark results saved to: {args.out}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        if baseline.get('environment') != current.get('environment'):
+            print("Note: the two runs come from different environments.")
+        sys.exit(1 if print_comparison(compare(baseline, current, args.threshold), args.threshold) else 0)
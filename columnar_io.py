@@ -0,0 +1,183 @@
+import argparse
+import os
+import re
+import pandas as pd
+
+# CSV stays the default everywhere; Parquet / Feather are picked by file
+# extension and need pyarrow, which is only imported when such a file is used.
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+DEFAULT_COMPRESSION = 'zstd'
+
+# Typed result columns; the label is a small fixed vocabulary (fixed
+# categories so every chunk shares one dictionary)
+SAFETY_LABELS = ["Safe", "Moderately Safe", "Unsafe", "Highly Unsafe", "No Result"]
+RESULT_DTYPES = {'Safety Score': 'Int64', 'Safety Label': pd.CategoricalDtype(SAFETY_LABELS)}
+
+
+def table_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Unsupported table format '{ext}' for {path}, expected one of {sorted(FORMATS)}")
+    return FORMATS[ext]
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet / Feather files need pyarrow (pip install pyarrow); "
+                          "use .csv paths otherwise") from None
+    return pyarrow
+
+
+def read_table(path, columns=None, dtype=None):
+    # Whole table with column projection; `dtype` only applies to CSV, the
+    # columnar formats carry their own types
+    fmt = table_format(path)
+    if fmt == 'csv':
+        return pd.read_csv(path, usecols=columns, dtype=dtype)
+    _arrow()
+    if fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+
+def iter_table(path, columns=None, dtype=None, chunk_size=10000):
+    # Chunked reader with column projection; only the requested columns are
+    # parsed (CSV) or decoded (Parquet row groups / Feather record batches)
+    fmt = table_format(path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunk_size)
+        return
+    pa = _arrow()
+    if fmt == 'parquet':
+        batches = pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns)
+        for batch in batches:
+            yield batch.to_pandas()
+        return
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size).to_pandas()
+
+
+def _typed(df):
+    df = df.copy()
+    for column, dtype in RESULT_DTYPES.items():
+        if column in df:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+class TableWriter:
+    # Appends DataFrame chunks to one CSV / Parquet / Feather file. Parquet
+    # and Feather fix the schema from the first chunk; each chunk becomes a
+    # row group / record batch.
+
+    def __init__(self, path, compression=DEFAULT_COMPRESSION):
+        self.path = path
+        self.format = table_format(path)
+        self.compression = compression
+        self.rows = 0
+        self._file = None
+        self._writer = None
+        self._schema = None
+        if self.format == 'csv':
+            self._file = open(path, 'w', newline='')
+        else:
+            self._pa = _arrow()
+
+    def write(self, df):
+        if self.format == 'csv':
+            df.to_csv(self._file, index=False, header=self.rows == 0)
+        else:
+            pa = self._pa
+            table = pa.Table.from_pandas(_typed(df), schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                if self.format == 'parquet':
+                    self._writer = pa.parquet.ParquetWriter(self.path, self._schema, compression=self.compression)
+                else:
+                    options = pa.ipc.IpcWriteOptions(compression=self.compression)
+                    self._writer = pa.ipc.new_file(self.path, self._schema, options=options)
+            self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+        elif self.format == 'parquet':
+            # No rows: still leave a readable (empty) file behind
+            pd.DataFrame().to_parquet(self.path)
+        elif self.format == 'feather':
+            pd.DataFrame().to_feather(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_table(df, path, compression=DEFAULT_COMPRESSION):
+    with TableWriter(path, compression) as writer:
+        writer.write(df)
+    return path
+
+
+def session_date(stem):
+    # "20250601_142500" (imu.py's file stem) -> "2025-06-01"
+    match = re.match(r"(\d{4})(\d{2})(\d{2})", stem)
+    return "-".join(match.groups()) if match else "unknown"
+
+
+def partition_path(root, session, ext='.parquet'):
+    # Hive-style layout, so pyarrow.dataset / DuckDB / Spark can prune on
+    # date and session: <root>/date=YYYY-MM-DD/session=<stem>/part-0.parquet
+    return os.path.join(root, f"date={session_date(session)}", f"session={session}", "part-0" + ext)
+
+
+def read_partitioned(root, columns=None, filters=None):
+    # e.g. filters=[('date', '>=', '2025-06-01')]; partition keys come back
+    # as columns
+    _arrow()
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(root, format='parquet', partitioning='hive')
+    expression = None
+    for name, op, value in filters or []:
+        term = {'==': ds.field(name) == value, '!=': ds.field(name) != value,
+                '<': ds.field(name) < value, '<=': ds.field(name) <= value,
+                '>': ds.field(name) > value, '>=': ds.field(name) >= value}[op]
+        expression = term if expression is None else expression & term
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def convert(src, dst, chunk_size=100000, compression=DEFAULT_COMPRESSION):
+    # Streams a table from one format to another, e.g. an OBD / IMU CSV
+    # archive into Parquet. Numeric columns are stored as float64 so every
+    # chunk has the same schema.
+    with TableWriter(dst, compression) as writer:
+        for chunk in iter_table(src, chunk_size=chunk_size):
+            numeric = chunk.select_dtypes('number').columns
+            chunk[numeric] = chunk[numeric].astype('float64')
+            writer.write(chunk)
+    return writer.rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert session tables between CSV, Parquet and Feather")
+    parser.add_argument("src")
+    parser.add_argument("dst", help="output path; the extension picks the format")
+    parser.add_argument("--compression", default=DEFAULT_COMPRESSION)
+    args = parser.parse_args()
+    rows = convert(args.src, args.dst, compression=args.compression)
+    print(f"Converted {rows} rows to: {args.dst}")
@@ -0,0 +1,108 @@
+import argparse
+import time
+import numpy as np
+from batch_inference import INPUT_COLUMNS, INPUT_VARIABLES, safety_label
+from columnar_io import read_table
+from compiled_model import load_or_compile
+
+SESSIONS = ["safe_riding.csv", "aggressive_riding.csv"]
+IMU_FILE = "20250601_142500_imu.csv"
+
+
+def load_session(obd_file, imu_file=IMU_FILE):
+    # Same index pairing as Build_simulation.py
+    obd_df = read_table(obd_file)
+    sensor_df = read_table(imu_file, ['accel_x', 'accel_z'])
+    lean = np.degrees(np.arctan2(sensor_df["accel_x"], sensor_df["accel_z"])).abs()
+    n = min(len(obd_df), len(sensor_df))
+    obd_df = obd_df.iloc[:n].reset_index(drop=True)
+    obd_df["lean"] = lean.iloc[:n].to_numpy()
+    return obd_df[[INPUT_COLUMNS[v] for v in INPUT_VARIABLES]].to_numpy(dtype=float)
+
+
+def synthetic_inputs(engine, n, seed=0):
+    rng = np.random.default_rng(seed)
+    lo = [v[1][0] for v in engine.variables]
+    hi = [v[1][-1] for v in engine.variables]
+    return rng.uniform(lo, hi, size=(n, len(lo)))
+
+
+def skfuzzy_scores(X):
+    from skfuzzy import control as ctrl
+    from define_fuzzy_rules import rules
+    system = ctrl.ControlSystem(rules)
+    out = []
+    for row in X:
+        try:
+            sim = ctrl.ControlSystemSimulation(system)
+            for name, value in zip(INPUT_VARIABLES, row):
+                sim.input[name] = value
+            sim.compute()
+            out.append(sim.output['safety'])
+        except Exception:
+            out.append(np.nan)
+    return np.array(out)
+
+
+def timed(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def agreement(a, b):
+    both = ~np.isnan(a) & ~np.isnan(b)
+    labels_a = [safety_label(s) for s in np.round(a[both])]
+    labels_b = [safety_label(s) for s in np.round(b[both])]
+    return {
+        'max_abs_diff': float(np.abs(a[both] - b[both]).max()) if both.any() else 0.0,
+        'mean_abs_diff': float(np.abs(a[both] - b[both]).mean()) if both.any() else 0.0,
+        'label_agreement_pct': 100.0 * np.mean([x == y for x, y in zip(labels_a, labels_b)]) if both.any() else 100.0,
+        'mask_agreement_pct': 100.0 * np.mean(np.isnan(a) == np.isnan(b)),
+    }
+
+
+def compare_modes(engine, X, repeat=5, reference=None):
+    (grid, _), t_grid = timed(lambda: engine.score(X, mode='grid'), repeat)
+    (analytic, _), t_analytic = timed(lambda: engine.score(X, mode='analytic'), repeat)
+    report = {
+        'rows': len(X),
+        'grid_us_per_row': 1e6 * t_grid / len(X),
+        'analytic_us_per_row': 1e6 * t_analytic / len(X),
+        'analytic_vs_grid': agreement(analytic, grid),
+    }
+    if reference is not None:
+        report['grid_vs_skfuzzy'] = agreement(grid, reference)
+        report['analytic_vs_skfuzzy'] = agreement(analytic, reference)
+    return report
+
+
+def print_report(name, report):
+    print(f"{name} ({report['rows']} rows)")
+    print(f"- grid:     {report['grid_us_per_row']:.2f} us/row")
+    print(f"- analytic: {report['analytic_us_per_row']:.2f} us/row")
+    for key in ('analytic_vs_grid', 'grid_vs_skfuzzy', 'analytic_vs_skfuzzy'):
+        if key in report:
+            r = report[key]
+            print(f"- {key}: max |diff| {r['max_abs_diff']:.4f}, mean |diff| {r['mean_abs_diff']:.4f}, "
+                  f"labels {r['label_agreement_pct']:.1f}%, masks {r['mask_agreement_pct']:.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy and speed of grid vs analytic inference")
+    parser.add_argument("--synthetic-rows", type=int, default=100000)
+    parser.add_argument("--skfuzzy", action="store_true",
+                        help="also compare against ControlSystemSimulation (slow)")
+    args = parser.parse_args()
+
+    engine = load_or_compile()
+    for session in SESSIONS:
+        X = load_session(session)
+        reference = skfuzzy_scores(X) if args.skfuzzy else None
+        print_report(session, compare_modes(engine, X, reference=reference))
+
+    X = synthetic_inputs(engine, args.synthetic_rows)
+    print_report("synthetic", compare_modes(engine, X, repeat=2))
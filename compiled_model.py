@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import numpy as np
+from batch_inference import FuzzyBatchEngine
+
+# Bump whenever the artifact layout changes; old artifacts are rebuilt.
+MODEL_FORMAT_VERSION = 2
+
+MODEL_FILE = "fuzzy_model.npz"
+MODEL_SOURCES = [
+    "output_fuzzy_mf_parameters_safe.csv",
+    "define_fuzzy_variables.py",
+    "define_fuzzy_rules.py",
+]
+
+
+def source_hash(sources=MODEL_SOURCES):
+    h = hashlib.sha256()
+    for path in sources:
+        h.update(path.encode())
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def engine_hash(engine):
+    # Identity of a compiled model itself (MF arrays, trimf parameters,
+    # rules), for engines that do not come from MODEL_SOURCES, e.g. tuned
+    # or spec-built ones
+    h = hashlib.sha256()
+    for name, universe, labels, mfs in engine.variables + [engine.output]:
+        h.update(json.dumps([name, labels]).encode())
+        h.update(np.ascontiguousarray(universe, dtype=float).tobytes())
+        h.update(np.ascontiguousarray(mfs, dtype=float).tobytes())
+    for name, params in sorted((engine.mf_parameters or {}).items()):
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(params, dtype=float).tobytes())
+    h.update(json.dumps(engine.rules).encode())
+    return h.hexdigest()
+
+
+def save_engine(engine, path=MODEL_FILE, model_hash=""):
+    arrays = {}
+    meta = {
+        'version': MODEL_FORMAT_VERSION,
+        'source_hash': model_hash,
+        'inputs': [],
+        'output': None,
+    }
+    for i, (name, universe, labels, mfs) in enumerate(engine.variables):
+        meta['inputs'].append({'name': name, 'labels': labels})
+        arrays[f'universe_{i}'] = universe
+        arrays[f'mfs_{i}'] = mfs
+    name, universe, labels, mfs = engine.output
+    meta['output'] = {'name': name, 'labels': labels}
+    arrays['output_universe'] = universe
+    arrays['output_mfs'] = mfs
+    if engine.mf_parameters is not None:
+        for var, params in engine.mf_parameters.items():
+            arrays[f'params_{var}'] = params
+
+    # Rule programs flattened into one (M x 3) instruction table + offsets
+    ops, offsets, cons = [], [0], []
+    for r, (program, consequent) in enumerate(engine.rules):
+        ops.extend(program)
+        offsets.append(len(ops))
+        cons.extend((r, k, w) for k, w in consequent)
+    arrays['rule_ops'] = np.array(ops, dtype=np.int32).reshape(-1, 3)
+    arrays['rule_offsets'] = np.array(offsets, dtype=np.int64)
+    arrays['cons_rule'] = np.array([c[0] for c in cons], dtype=np.int64)
+    arrays['cons_term'] = np.array([c[1] for c in cons], dtype=np.int64)
+    arrays['cons_weight'] = np.array([c[2] for c in cons], dtype=float)
+
+    arrays['meta'] = np.array(json.dumps(meta))
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def load_engine(path=MODEL_FILE, expected_hash=None, mode='grid'):
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        if meta['version'] != MODEL_FORMAT_VERSION:
+            raise ValueError(f"Model format {meta['version']} in {path}, expected {MODEL_FORMAT_VERSION}")
+        if expected_hash is not None and meta['source_hash'] != expected_hash:
+            raise ValueError(f"Model {path} was compiled from different sources")
+
+        variables = [(v['name'], data[f'universe_{i}'], v['labels'], data[f'mfs_{i}'])
+                     for i, v in enumerate(meta['inputs'])]
+        output = (meta['output']['name'], data['output_universe'], meta['output']['labels'], data['output_mfs'])
+        params = {key[len('params_'):]: data[key] for key in data.files if key.startswith('params_')}
+
+        ops = [tuple(int(x) for x in op) for op in data['rule_ops']]
+        offsets = data['rule_offsets']
+        rules = [(ops[offsets[r]:offsets[r + 1]], []) for r in range(len(offsets) - 1)]
+        for r, k, w in zip(data['cons_rule'], data['cons_term'], data['cons_weight']):
+            rules[int(r)][1].append((int(k), float(w)))
+
+    return FuzzyBatchEngine(variables, output, rules, mf_parameters=params or None, mode=mode)
+
+
+def compile_model(path=MODEL_FILE, mode='grid'):
+    # The only place that needs pandas / skfuzzy
+    from define_fuzzy_variables import fuzzy_variables, mf_parameters
+    from define_fuzzy_rules import rules
+    engine = FuzzyBatchEngine.from_skfuzzy(fuzzy_variables, rules, mf_parameters=mf_parameters, mode=mode)
+    save_engine(engine, path, model_hash=source_hash())
+    return engine
+
+
+def load_or_compile(path=MODEL_FILE, mode='grid'):
+    # Reuse the artifact when it matches the current MF parameters and rule
+    # base; otherwise (missing, stale or old format) rebuild it.
+    current = source_hash()
+    if os.path.exists(path):
+        try:
+            return load_engine(path, expected_hash=current, mode=mode)
+        except (ValueError, KeyError):
+            pass
+    return compile_model(path, mode=mode)
+
+
+if __name__ == "__main__":
+    engine = compile_model()
+    print(f"Compiled {len(engine.rules)} rules over {len(engine.variables)} inputs.")
+    print(f"Model saved to: {MODEL_FILE}")
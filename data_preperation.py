@@ -1,10 +1,15 @@
 import pandas as pd
 import os
+from mf_calibration import calibrate, expand_inputs, mf_parameters
 
 INPUT_FILE = "safe_riding.csv"
-assert os.path.exists(INPUT_FILE), f"Input file {INPUT_FILE} not found."
 
-bike_df = pd.read_csv(INPUT_FILE)
+# Set to a list of OBD CSVs / globs (e.g. ["obd/*.csv"]) to calibrate from the
+# whole archive with streaming quantile sketches instead of loading INPUT_FILE
+# into memory; CALIBRATION_SKETCH keeps the sketch so later runs only read new
+# rides (see mf_calibration.py for sharded / parallel runs)
+CALIBRATION_FILES = None
+CALIBRATION_SKETCH = "mf_calibration_sketch.npz"
 
 selected_vars = {
     'Vehicle speed (km/h)': 'speed',
@@ -15,25 +20,22 @@ selected_vars = {
     'Intake manifold absolute pressure (psi)': 'intake_pressure'
 }
 
-stats = bike_df[list(selected_vars.keys())].describe(percentiles=[.25, .5, .75])
-stats = stats.loc[['min', '25%', '50%', '75%', 'max']]
-stats.index = ['min', 'q1', 'median', 'q3', 'max']
+if CALIBRATION_FILES:
+    calibration, _ = calibrate(expand_inputs(CALIBRATION_FILES), CALIBRATION_SKETCH)
+    stats = calibration.stats()[list(selected_vars.keys())]
+else:
+    assert os.path.exists(INPUT_FILE), f"Input file {INPUT_FILE} not found."
+    bike_df = pd.read_csv(INPUT_FILE)
+    stats = bike_df[list(selected_vars.keys())].describe(percentiles=[.25, .5, .75])
+    stats = stats.loc[['min', '25%', '50%', '75%', 'max']]
+    stats.index = ['min', 'q1', 'median', 'q3', 'max']
 
-mf_params = []
-for col, short_name in selected_vars.items():
-    minv = stats.loc['min', col]
-    q1 = stats.loc['q1', col]
-    median = stats.loc['median', col]
-    q3 = stats.loc['q3', col]
-    maxv = stats.loc['max', col]
-    mf_params += [
-        {'Variable': short_name, 'Label': 'Low',    'a': minv,   'b': minv,   'c': q1},
-        {'Variable': short_name, 'Label': 'Medium', 'a': q1,     'b': median, 'c': q3},
-        {'Variable': short_name, 'Label': 'High',   'a': median, 'b': maxv,   'c': maxv}
-    ]
+# Low / Medium / High trimfs from the five-number summary (one definition,
+# shared with mf_calibration.py)
+mf_params = mf_parameters(stats, selected_vars)
 
 stats.to_csv("output_descriptive_stats_safe.csv")
-pd.DataFrame(mf_params).to_csv("output_fuzzy_mf_parameters_safe.csv", index=False)
+mf_params.to_csv("output_fuzzy_mf_parameters_safe.csv", index=False)
 
 print("Data preparation complete. Files saved:")
 print("- output_descriptive_stats.csv")
@@ -19,22 +19,34 @@ fuzzy_inputs = {}
 for var in ['speed', 'rpm', 'acceleration', 'throttle', 'power', 'intake_pressure']:
     fuzzy_inputs[var] = ctrl.Antecedent(universes[var], var)
 
+# trimf [a, b, c] of every term, kept so inference can use the exact triangles
+mf_parameters = {var: {} for var in universes}
+
 fuzzy_inputs['lean'] = ctrl.Antecedent(universes['lean'], 'lean')
-fuzzy_inputs['lean']['low'] = fuzz.trimf(universes['lean'], [0.0, 0.0, 20.0])
-fuzzy_inputs['lean']['medium'] = fuzz.trimf(universes['lean'], [20.0, 25.0, 30.0])
-fuzzy_inputs['lean']['high'] = fuzz.trimf(universes['lean'], [30.0, 50.0, 70.0])
+mf_parameters['lean'] = {
+    'low': [0.0, 0.0, 20.0],
+    'medium': [20.0, 25.0, 30.0],
+    'high': [30.0, 50.0, 70.0]
+}
+for label, abc in mf_parameters['lean'].items():
+    fuzzy_inputs['lean'][label] = fuzz.trimf(universes['lean'], abc)
 
 for _, row in mf_params_df.iterrows():
     var = row['Variable']
     label = row['Label'].lower()
     a, b, c = row['a'], row['b'], row['c']
+    mf_parameters[var][label] = [a, b, c]
     fuzzy_inputs[var][label] = fuzz.trimf(universes[var], [a, b, c])
 
 safety = ctrl.Consequent(np.linspace(0, 10, 100), 'safety')
-safety['safe'] = fuzz.trimf(safety.universe, [0, 0, 3])
-safety['moderately_safe'] = fuzz.trimf(safety.universe, [2, 4, 6])
-safety['unsafe'] = fuzz.trimf(safety.universe, [5, 7, 9])
-safety['highly_unsafe'] = fuzz.trimf(safety.universe, [8, 10, 10])
+mf_parameters['safety'] = {
+    'safe': [0, 0, 3],
+    'moderately_safe': [2, 4, 6],
+    'unsafe': [5, 7, 9],
+    'highly_unsafe': [8, 10, 10]
+}
+for label, abc in mf_parameters['safety'].items():
+    safety[label] = fuzz.trimf(safety.universe, abc)
 
 print("Fuzzy input and output variables defined.")
 
@@ -0,0 +1,106 @@
+import random
+import struct
+
+ACCEL_XOUT_H = 0x3B
+BURST_LENGTH = 14
+
+
+class FakeSMBus:
+    # Stand-in for smbus2.SMBus that replays recorded MPU6050 register blocks,
+    # so imu.py can run on a dev box without hardware. Each frame is the
+    # 14-byte block at 0x3B-0x48; reading 0x3B (single byte or block) starts
+    # the next frame, the other registers read from the current one. When the
+    # frames run out the replay wraps around (loop=True) or raises OSError.
+    # fail_rate makes that share of block reads raise OSError, to exercise
+    # error handling.
+
+    def __init__(self, frames, address=0x68, loop=True, fail_rate=0.0, seed=0):
+        self.frames = [bytes(f) for f in frames]
+        if not self.frames or any(len(f) != BURST_LENGTH for f in self.frames):
+            raise ValueError(f"Frames must be non-empty {BURST_LENGTH}-byte register blocks")
+        self.address = address
+        self.loop = loop
+        self.position = -1
+        self.transactions = 0
+        self.writes = []
+        self.closed = False
+        self.fail_rate = fail_rate
+        self.failures = 0
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_raw(cls, samples, **kwargs):
+        # samples: iterable of (ax, ay, az, temp, gx, gy, gz) raw int16 counts
+        return cls([struct.pack('>7h', *s) for s in samples], **kwargs)
+
+    def _check(self, address):
+        if self.closed:
+            raise OSError("Bus is closed")
+        if address != self.address:
+            raise OSError(f"No device at address 0x{address:X}")
+        self.transactions += 1
+
+    def _advance(self):
+        self.position += 1
+        if self.position >= len(self.frames):
+            if not self.loop:
+                raise OSError("Replay exhausted")
+            self.position = 0
+
+    def _register(self, reg):
+        offset = reg - ACCEL_XOUT_H
+        if 0 <= offset < BURST_LENGTH:
+            return self.frames[max(self.position, 0)][offset]
+        return 0
+
+    def write_byte_data(self, address, register, value):
+        self._check(address)
+        self.writes.append((register, value))
+
+    def read_byte_data(self, address, register):
+        self._check(address)
+        if register == ACCEL_XOUT_H:
+            self._advance()
+        return self._register(register)
+
+    def read_i2c_block_data(self, address, register, length):
+        self._check(address)
+        if self.fail_rate and self._random.random() < self.fail_rate:
+            self.failures += 1
+            raise OSError("Simulated I2C error")
+        if register == ACCEL_XOUT_H:
+            self._advance()
+        return [self._register(register + i) for i in range(length)]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeI2CBus:
+    # Several simulated devices sharing one bus, dispatched by address (e.g.
+    # two MPU6050s at 0x68 and 0x69). Addresses with no device raise OSError
+    # like a NACK on real hardware.
+
+    def __init__(self, devices):
+        self.devices = {d.address: d for d in devices}
+        self.closed = False
+
+    def _device(self, address):
+        if self.closed:
+            raise OSError("Bus is closed")
+        if address not in self.devices:
+            raise OSError(f"No device at address 0x{address:X}")
+        return self.devices[address]
+
+    def write_byte_data(self, address, register, value):
+        self._device(address).write_byte_data(address, register, value)
+
+    def read_byte_data(self, address, register):
+        return self._device(address).read_byte_data(address, register)
+
+    def read_i2c_block_data(self, address, register, length):
+        return self._device(address).read_i2c_block_data(address, register, length)
+
+    def close(self):
+        self.closed = True
+
@@ -0,0 +1,159 @@
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from columnar_io import FORMATS, partition_path
+from compiled_model import MODEL_FILE, load_engine, load_or_compile
+from session_stream import stream_session, score_aligned_session
+
+IMU_SUFFIX = "_imu"
+OBD_SUFFIX = "_obd"
+
+SUMMARY_COLUMNS = ['session', 'rows', 'scored', 'mean_score', 'percent_unsafe', 'rating']
+
+_engine = None
+
+
+def _find_table(directory, name):
+    # <name>.csv, .parquet or .feather, whichever exists (CSV first)
+    for ext in FORMATS:
+        path = os.path.join(directory, name + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def find_sessions(imu_dir="./imu", obd_dir="./obd"):
+    # Pairs imu/<stem>_imu.csv (as written by imu.py) with obd/<stem>_obd.csv;
+    # either side may also be a .parquet / .feather conversion.
+    # Returns (sessions, unpaired IMU files).
+    sessions, unpaired = [], []
+    stems = set()
+    for path in glob.glob(os.path.join(imu_dir, "*" + IMU_SUFFIX + ".*")):
+        name, ext = os.path.splitext(os.path.basename(path))
+        if ext.lower() in FORMATS:
+            stems.add(name[:-len(IMU_SUFFIX)])
+    for stem in sorted(stems):
+        imu_file = _find_table(imu_dir, stem + IMU_SUFFIX)
+        obd_file = _find_table(obd_dir, stem + OBD_SUFFIX)
+        if obd_file:
+            sessions.append((stem, obd_file, imu_file))
+        else:
+            unpaired.append(imu_file)
+    return sessions, unpaired
+
+
+def session_paths(out_dir, stem, result_format="csv", partition=False):
+    # partition=True writes results as <out_dir>/results/date=.../session=<stem>/
+    # so they can be queried as one dataset (see columnar_io.read_partitioned)
+    ext = "." + result_format
+    if partition:
+        results_file = partition_path(os.path.join(out_dir, "results"), stem, ext)
+    else:
+        results_file = os.path.join(out_dir, "sessions", stem + "_results" + ext)
+    return results_file, os.path.join(out_dir, "sessions", stem + "_summary.json")
+
+
+def is_complete(out_dir, stem):
+    # The summary is written last, so its presence marks a finished session
+    return os.path.exists(session_paths(out_dir, stem)[1])
+
+
+def _init_worker(model_path):
+    # Each worker loads the compiled model once and reuses it for every session
+    global _engine
+    _engine = load_engine(model_path)
+
+
+def score_session(stem, obd_file, imu_file, out_dir, alignment="index", chunk_size=10000, result_format="csv",
+                  partition=False):
+    results_file, summary_file = session_paths(out_dir, stem, result_format, partition)
+    os.makedirs(os.path.dirname(results_file), exist_ok=True)
+    # "_" prefix: a partial file left by a failed session is skipped by
+    # pyarrow dataset discovery (read_partitioned) and never read as data
+    directory, name = os.path.split(results_file)
+    root, ext = os.path.splitext(name)
+    tmp = os.path.join(directory, "_" + root + ".part" + ext)
+    if alignment == "index":
+        summary = stream_session(_engine, obd_file, imu_file, tmp, chunk_size=chunk_size)
+    else:
+        summary = score_aligned_session(_engine, obd_file, imu_file, tmp, rate=alignment)
+    os.replace(tmp, results_file)
+
+    record = {
+        'session': stem,
+        'rows': summary.rows,
+        'scored': summary.scored,
+        'mean_score': summary.mean_score if summary.scored else None,
+        'percent_unsafe': round(summary.percent_unsafe, 2),
+        'rating': summary.rating
+    }
+    with open(summary_file + ".part", 'w') as f:
+        json.dump(record, f)
+    os.replace(summary_file + ".part", summary_file)
+    return record
+
+
+def write_fleet_summary(out_dir, stems):
+    records = []
+    for stem in stems:
+        summary_file = session_paths(out_dir, stem)[1]
+        if os.path.exists(summary_file):
+            with open(summary_file) as f:
+                records.append(json.load(f))
+    fleet = pd.DataFrame(records, columns=SUMMARY_COLUMNS)
+    fleet.to_csv(os.path.join(out_dir, "fleet_summary.csv"), index=False)
+    return fleet
+
+
+def run_fleet(imu_dir="./imu", obd_dir="./obd", out_dir="Result/fleet", workers=None, alignment="index",
+              model_path=MODEL_FILE, chunk_size=10000, result_format="csv", partition=False):
+    os.makedirs(os.path.join(out_dir, "sessions"), exist_ok=True)
+    sessions, unpaired = find_sessions(imu_dir, obd_dir)
+    for imu_file in unpaired:
+        print(f"Skipping {imu_file}: no matching OBD export.")
+
+    pending = [s for s in sessions if not is_complete(out_dir, s[0])]
+    print(f"{len(sessions)} sessions found, {len(sessions) - len(pending)} already complete.")
+
+    failed = []
+    if pending:
+        load_or_compile(model_path)  # compile once in the parent; workers only load it
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+            futures = {pool.submit(score_session, stem, obd_file, imu_file, out_dir, alignment, chunk_size,
+                                   result_format, partition): stem
+                       for stem, obd_file, imu_file in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                stem = futures[future]
+                try:
+                    record = future.result()
+                    print(f"[{done}/{len(pending)}] {stem}: mean {record['mean_score']}, "
+                          f"{record['percent_unsafe']:.1f}% unsafe")
+                except Exception as e:
+                    failed.append(stem)
+                    print(f"[{done}/{len(pending)}] {stem}: failed ({e})")
+
+    fleet = write_fleet_summary(out_dir, [s[0] for s in sessions])
+    return fleet, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every IMU/OBD session pair in parallel")
+    parser.add_argument("--imu-dir", default="./imu")
+    parser.add_argument("--obd-dir", default="./obd")
+    parser.add_argument("--out-dir", default="Result/fleet")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per core")
+    parser.add_argument("--alignment", default="index", choices=["index", "obd", "imu"])
+    parser.add_argument("--format", default="csv", choices=["csv", "parquet", "feather"],
+                        help="per-session results format (parquet / feather need pyarrow)")
+    parser.add_argument("--partition", action="store_true",
+                        help="write results under results/date=YYYY-MM-DD/session=<stem>/")
+    args = parser.parse_args()
+
+    fleet, failed = run_fleet(args.imu_dir, args.obd_dir, args.out_dir, args.workers, args.alignment,
+                              result_format=args.format, partition=args.partition)
+    print("Fleet scoring complete.")
+    print(f"- {len(fleet)} sessions summarized, {len(failed)} failed.")
+    print(f"Fleet summary saved to: {os.path.join(args.out_dir, 'fleet_summary.csv')}")
@@ -2,16 +2,55 @@ from smbus2 import SMBus
 import time
 import csv
 import os
+import struct
+import argparse
 from datetime import datetime
 
+# Accel X/Y/Z, temperature and gyro X/Y/Z as big-endian int16 (0x3B-0x48)
+BURST_LENGTH = 14
+
+class RateScheduler:
+    # Fixed-rate loop timing on the monotonic clock. Deadlines are
+    # start + k * period, so processing time never accumulates as drift;
+    # deadlines that have already passed are skipped and counted as missed.
+    def __init__(self, rate_hz):
+        if rate_hz <= 0:
+            raise ValueError("rate_hz must be positive")
+        self.period = 1.0 / rate_hz
+        self.start = None
+        self.ticks = 0
+        self.missed = 0
+
+    def wait(self):
+        now = time.monotonic()
+        if self.start is None:
+            self.start = now
+            return
+        self.ticks += 1
+        deadline = self.start + self.ticks * self.period
+        if now > deadline:
+            late = int((now - deadline) / self.period)
+            self.missed += late + 1
+            self.ticks += late + 1
+            deadline = self.start + self.ticks * self.period
+        time.sleep(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        return {"ticks": self.ticks, "missed_deadlines": self.missed, "period_s": self.period}
+
 class MPU6050:
-    def __init__(self, bus_id=1, address=0x68, verbose=True):
+    def __init__(self, bus_id=1, address=0x68, verbose=True, bus=None, retries=2):
+        # `bus` injects an already-open SMBus-compatible object (e.g. FakeSMBus);
+        # `retries` re-issues a burst read that failed with a transient I/O error
         self.address = address
         self.verbose = verbose
+        self.retries = retries
+        self.retried = 0
         try:
-            self.bus = SMBus(bus_id)
+            self.bus = bus if bus is not None else SMBus(bus_id)
             self.PWR_MGMT_1 = 0x6B
             self.ACCEL_XOUT_H = 0x3B
+            self.TEMP_OUT_H = 0x41
             self.GYRO_XOUT_H = 0x43
             self.bus.write_byte_data(self.address, self.PWR_MGMT_1, 0)  # Wake up MPU6050
             if self.verbose:
@@ -33,6 +72,39 @@ class MPU6050:
                 print(f"Error reading raw data from reg 0x{reg:X}: {e}")
             return None
 
+    def read_burst(self):
+        # One block transaction for the whole accel/temp/gyro register block
+        if self.bus is None:
+            raise IOError("I2C bus is not initialized.")
+        for attempt in range(self.retries + 1):
+            try:
+                block = self.bus.read_i2c_block_data(self.address, self.ACCEL_XOUT_H, BURST_LENGTH)
+                return struct.unpack('>7h', bytes(block))
+            except Exception as e:
+                if attempt < self.retries:
+                    self.retried += 1
+                elif self.verbose:
+                    print(f"Error burst reading from reg 0x{self.ACCEL_XOUT_H:X}: {e}")
+        return None
+
+    def get_motion_data(self):
+        raw = self.read_burst()
+        if raw is None:
+            return {
+                "status": 500,
+                "accel": {'x': None, 'y': None, 'z': None},
+                "gyro": {'x': None, 'y': None, 'z': None},
+                "temp": None,
+                "message": "Burst read failed."
+            }
+        ax, ay, az, temp, gx, gy, gz = raw
+        return {
+            "status": 200,
+            "accel": {'x': ax / 16384.0, 'y': ay / 16384.0, 'z': az / 16384.0},
+            "gyro": {'x': gx / 131.0, 'y': gy / 131.0, 'z': gz / 131.0},
+            "temp": temp / 340.0 + 36.53
+        }
+
     def get_accel_data(self):
         try:
             ax = self.read_raw_data(self.ACCEL_XOUT_H)
@@ -94,22 +166,25 @@ class MPU6050:
         self.close()
 
 # Main program loop with CSV logging
-def main_Call():
-    filename = "./imu/"+datetime.now().strftime("%Y%m%d_%H%M%S") + "_imu.csv"
-
+def main_Call(rate_hz=2.0, bus=None, max_samples=None, log_format="csv", echo_every=1):
+    # log_format="bin" writes fixed-width records through a background thread
+    # (see imu_binlog.py); echo_every prints every Nth sample (0 = never)
+    stem = "./imu/"+datetime.now().strftime("%Y%m%d_%H%M%S") + "_imu"
+    filename = stem + (".bin" if log_format == "bin" else ".csv")
 
     # Create CSV file and write headers if it doesn't exist
-    file_exists = os.path.isfile(filename)
-    with open(filename, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow([
-                "timestamp",
-                "accel_x", "accel_y", "accel_z",
-                "gyro_x", "gyro_y", "gyro_z"
-            ])
-
-    with MPU6050(verbose=True) as sensor:
+    if log_format == "csv":
+        file_exists = os.path.isfile(filename)
+        with open(filename, mode='a', newline='') as file:
+            writer = csv.writer(file)
+            if not file_exists:
+                writer.writerow([
+                    "timestamp",
+                    "accel_x", "accel_y", "accel_z",
+                    "gyro_x", "gyro_y", "gyro_z"
+                ])
+
+    with MPU6050(verbose=True, bus=bus) as sensor:
         if sensor.bus is None:
             return {
                 "status": 503,
@@ -118,37 +193,67 @@ def main_Call():
                 "gyro": None
             }
 
+        scheduler = RateScheduler(rate_hz)
+        samples = 0
+        log = file = None
         try:
-            with open(filename, mode='a', newline='') as file:
+            if log_format == "bin":
+                from imu_binlog import BinaryLogWriter
+                log = BinaryLogWriter(filename)
+            else:
+                file = open(filename, mode='a', newline='')
                 writer = csv.writer(file)
 
-                while True:
-                    accel_data = sensor.get_accel_data()
-                    gyro_data = sensor.get_gyro_data()
+            while max_samples is None or samples < max_samples:
+                scheduler.wait()
+                data = sensor.get_motion_data()
+                samples += 1
 
-                    if accel_data["status"] == 200 and gyro_data["status"] == 200:
-                        a = accel_data["accel"]
-                        g = gyro_data["gyro"]
-                        timestamp = datetime.now().isoformat()
+                if data["status"] == 200:
+                    a = data["accel"]
+                    g = data["gyro"]
 
+                    if log is not None:
+                        log.append(time.time_ns(), a['x'], a['y'], a['z'], g['x'], g['y'], g['z'])
+                    else:
                         # Write to CSV
+                        timestamp = datetime.now().isoformat()
                         writer.writerow([timestamp, a['x'], a['y'], a['z'], g['x'], g['y'], g['z']])
 
-                        print(f"{timestamp} | Accel: X={a['x']:.2f}g Y={a['y']:.2f}g Z={a['z']:.2f}g | "
+                    if echo_every and samples % echo_every == 0:
+                        print(f"{datetime.now().isoformat()} | Accel: X={a['x']:.2f}g Y={a['y']:.2f}g Z={a['z']:.2f}g | "
                               f"Gyro: X={g['x']:.2f}°/s Y={g['y']:.2f}°/s Z={g['z']:.2f}°/s")
-                    else:
-                        print("Sensor read error:", accel_data.get("message", ""), gyro_data.get("message", ""))
+                else:
+                    print("Sensor read error:", data.get("message", ""))
 
-                    time.sleep(0.5)
+            return {
+                "status": 200,
+                "message": f"Recorded {samples} samples.",
+                **scheduler.stats()
+            }
 
         except KeyboardInterrupt:
             print("\nUser interrupted. Exiting MPU6050 reading.")
             return {
                 "status": 999,
-                "message": "User interrupted the sensor reading loop."
+                "message": "User interrupted the sensor reading loop.",
+                **scheduler.stats()
             }
 
+        finally:
+            if log is not None:
+                log.close()
+                if log.dropped:
+                    print(f"Binary log dropped {log.dropped} samples (writer could not keep up).")
+            elif file is not None:
+                file.close()
+
 # Call main if run directly
 if __name__ == "__main__":
-    final_result = main_Call()
+    parser = argparse.ArgumentParser(description="Log MPU6050 samples to CSV")
+    parser.add_argument("--rate", type=float, default=2.0, help="sampling rate in Hz (e.g. 50-200)")
+    parser.add_argument("--format", default="csv", choices=["csv", "bin"], help="log file format")
+    parser.add_argument("--echo-every", type=int, default=1, help="print every Nth sample (0 = never)")
+    args = parser.parse_args()
+    final_result = main_Call(rate_hz=args.rate, log_format=args.format, echo_every=args.echo_every)
     print("Final Result:", final_result)
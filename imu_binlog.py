@@ -0,0 +1,165 @@
+import argparse
+import csv
+import os
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import numpy as np
+
+# File layout: 16-byte header, then fixed 32-byte little-endian records
+# (int64 epoch nanoseconds + six float32 channels in g and deg/s)
+MAGIC = b"IMUBIN\x00\x01"
+HEADER = struct.Struct("<8sHH4x")
+FORMAT_VERSION = 1
+CHANNELS = ["accel_x", "accel_y", "accel_z", "gyro_x", "gyro_y", "gyro_z"]
+RECORD_DTYPE = np.dtype([('t_ns', '<i8')] + [(c, '<f4') for c in CHANNELS])
+
+CSV_HEADER = ["timestamp"] + CHANNELS
+
+
+class BinaryLogWriter:
+    # Background writer for the IMU logger. append() only pushes onto a
+    # bounded ring buffer, so a slow SD card never blocks sampling; when the
+    # buffer is full the oldest sample is dropped and counted. The writer
+    # thread drains the buffer in batches and fsyncs every `fsync_interval`
+    # seconds rather than per record.
+
+    def __init__(self, path, capacity=8192, batch_size=512, fsync_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.written = 0
+        self.dropped = 0
+        self.fsyncs = 0
+        self._buffer = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._closing = False
+        self._error = None
+
+        # Validate an existing log before opening it, so a mismatched header
+        # raises without leaving a file handle behind
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            _check_header(path)
+        self._file = open(path, 'ab')
+        if not exists:
+            self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_DTYPE.itemsize))
+        self._thread = threading.Thread(target=self._run, name="imu-binlog-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, t_ns, ax, ay, az, gx, gy, gz):
+        with self._cond:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append((t_ns, ax, ay, az, gx, gy, gz))
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def _take(self):
+        with self._cond:
+            while not self._buffer and not self._closing:
+                self._cond.wait(timeout=self.fsync_interval)
+                if not self._buffer:
+                    return []
+            n = min(len(self._buffer), self.batch_size)
+            return [self._buffer.popleft() for _ in range(n)]
+
+    def _run(self):
+        last_sync = time.monotonic()
+        try:
+            while True:
+                batch = self._take()
+                if batch:
+                    self._file.write(np.array(batch, dtype=RECORD_DTYPE).tobytes())
+                    self.written += len(batch)
+                if time.monotonic() - last_sync >= self.fsync_interval:
+                    self._sync()
+                    last_sync = time.monotonic()
+                with self._cond:
+                    if self._closing and not self._buffer:
+                        break
+        except Exception as e:
+            self._error = e
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.fsyncs += 1
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._buffer)
+        return {"written": self.written, "dropped": self.dropped, "pending": pending, "fsyncs": self.fsyncs}
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        self._sync()
+        self._file.close()
+        if self._error is not None:
+            raise IOError(f"Binary log writer failed: {self._error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _check_header(path):
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} IMU binary log")
+    magic, version, record_size = HEADER.unpack(header)
+    if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} IMU binary log")
+
+
+def open_log(path):
+    # Memory-mapped, zero-parse view of a session as a structured array;
+    # a trailing partial record (e.g. after power loss) is ignored.
+    _check_header(path)
+    n = (os.path.getsize(path) - HEADER.size) // RECORD_DTYPE.itemsize
+    if n == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(n,))
+
+
+def read_session(path):
+    # Column arrays keyed like the CSV schema; timestamps as datetime64[ns]
+    records = open_log(path)
+    session = {"timestamp": records['t_ns'].astype('datetime64[ns]')}
+    for c in CHANNELS:
+        session[c] = records[c]
+    return session
+
+
+def to_csv(bin_path, csv_path, chunk_size=65536):
+    # Writes the same schema imu.py logs (local-time ISO timestamp + six
+    # channels) so Build_simulation.py can read binary sessions unchanged.
+    records = open_log(bin_path)
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            stamps = [datetime.fromtimestamp(t // 10**9).replace(microsecond=t % 10**9 // 1000).isoformat()
+                      for t in chunk['t_ns'].tolist()]
+            channels = [chunk[c].astype(float).tolist() for c in CHANNELS]
+            writer.writerows(zip(stamps, *channels))
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an IMU binary log to the CSV schema")
+    parser.add_argument("bin_path")
+    parser.add_argument("csv_path", nargs="?")
+    args = parser.parse_args()
+    csv_path = args.csv_path or os.path.splitext(args.bin_path)[0] + ".csv"
+    n = to_csv(args.bin_path, csv_path)
+    print(f"Converted {n} records to: {csv_path}")
@@ -0,0 +1,221 @@
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+
+# Opt-in stage timers, counters and latency summaries for the scoring
+# pipeline. Instrumented code calls the module-level stage() / count() /
+# observe() / timed_iter(); until enable() is called those hit a no-op
+# collector, so the cost when disabled is one function call per stage per
+# chunk (timed_iter does not even wrap the iterator).
+#
+#   import instrumentation
+#   instrumentation.enable()
+#   ...run the pipeline...
+#   instrumentation.write("Result/metrics.prom")   # or .json
+
+PROMETHEUS_PREFIX = "bike_safety_"
+QUANTILES = (50, 95, 99)
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+_END = object()
+
+
+class NullCollector:
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def count(self, name, n=1, **labels):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+    def observe_total(self, name, total, n):
+        pass
+
+    def timed_iter(self, name, iterable):
+        return iterable
+
+
+class _Stage:
+    __slots__ = ('timer', 'start')
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter_ns() - self.start
+        timer = self.timer
+        timer[0] += 1
+        timer[1] += elapsed
+        if elapsed > timer[2]:
+            timer[2] = elapsed
+        if exc_type is not None:
+            timer[3] += 1
+        return False
+
+
+class MetricsCollector:
+    # Stage timers are [calls, total ns, max ns, errors]; counters are keyed
+    # by (name, labels); observations keep count / sum plus the last `window`
+    # values for percentiles, so memory stays bounded on long runs.
+    enabled = True
+
+    def __init__(self, window=100000):
+        self.window = window
+        self.started = time.time()
+        self.timers = {}
+        self.counters = {}
+        self.observations = {}
+
+    def stage(self, name):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = [0, 0, 0, 0]
+        return _Stage(timer)
+
+    def count(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name, value):
+        obs = self.observations.get(name)
+        if obs is None:
+            obs = self.observations[name] = [0, 0.0, deque(maxlen=self.window)]
+        obs[0] += 1
+        obs[1] += value
+        obs[2].append(value)
+
+    def observe_total(self, name, total, n):
+        # `total` spread over `n` events (e.g. one chunk's time over its rows):
+        # adds to count / sum only, so the mean is exact but no percentiles
+        # are reported for it
+        obs = self.observations.get(name)
+        if obs is None:
+            obs = self.observations[name] = [0, 0.0, deque(maxlen=self.window)]
+        obs[0] += n
+        obs[1] += total
+
+    def timed_iter(self, name, iterable):
+        # Times each next() as the stage `name` (e.g. reading CSV chunks)
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+
+    def snapshot(self):
+        stages = {name: {'calls': t[0], 'total_s': t[1] / 1e9, 'mean_ms': t[1] / t[0] / 1e6 if t[0] else 0.0,
+                         'max_ms': t[2] / 1e6, 'errors': t[3]} for name, t in self.timers.items()}
+        counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())]
+        observations = {}
+        for name, (n, total, values) in self.observations.items():
+            summary = {'count': n, 'sum': total, 'mean': total / n if n else 0.0}
+            if values:
+                for q, v in zip(QUANTILES, np.percentile(np.fromiter(values, float), QUANTILES)):
+                    summary[f'p{q}'] = float(v)
+            observations[name] = summary
+        return {'started': self.started, 'elapsed_s': time.time() - self.started, 'stages': stages,
+                'counters': counters, 'observations': observations}
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        p = PROMETHEUS_PREFIX
+        lines = [f"# TYPE {p}stage_seconds_total counter", f"# TYPE {p}stage_calls_total counter",
+                 f"# TYPE {p}stage_seconds_max gauge"]
+        for name, s in snap['stages'].items():
+            lines.append(f'{p}stage_seconds_total{{stage="{name}"}} {s["total_s"]:.9g}')
+            lines.append(f'{p}stage_calls_total{{stage="{name}"}} {s["calls"]}')
+            lines.append(f'{p}stage_seconds_max{{stage="{name}"}} {s["max_ms"] / 1e3:.9g}')
+        typed = set()
+        for c in snap['counters']:
+            if c['name'] not in typed:
+                lines.append(f"# TYPE {p}{c['name']}_total counter")
+                typed.add(c['name'])
+            labels = ",".join(f'{k}="{v}"' for k, v in c['labels'].items())
+            lines.append(f"{p}{c['name']}_total{{{labels}}} {c['value']}" if labels
+                         else f"{p}{c['name']}_total {c['value']}")
+        for name, o in snap['observations'].items():
+            lines.append(f"# TYPE {p}{name} summary")
+            for q in QUANTILES:
+                if f'p{q}' in o:
+                    lines.append(f'{p}{name}{{quantile="{q / 100}"}} {o[f"p{q}"]:.9g}')
+            lines.append(f"{p}{name}_sum {o['sum']:.9g}")
+            lines.append(f"{p}{name}_count {o['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # .prom / .txt -> Prometheus text exposition format (e.g. for the
+        # node_exporter textfile collector), anything else -> JSON. Written
+        # to a temp file and renamed so a scraper never sees a partial file.
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f:
+            if path.endswith(('.prom', '.txt')):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+        return path
+
+
+collector = NullCollector()
+
+
+def enable(window=100000):
+    global collector
+    if not collector.enabled:
+        collector = MetricsCollector(window)
+    return collector
+
+
+def disable():
+    global collector
+    collector = NullCollector()
+
+
+def stage(name):
+    return collector.stage(name)
+
+
+def count(name, n=1, **labels):
+    collector.count(name, n, **labels)
+
+
+def observe(name, value):
+    collector.observe(name, value)
+
+
+def observe_total(name, total, n):
+    collector.observe_total(name, total, n)
+
+
+def timed_iter(name, iterable):
+    return collector.timed_iter(name, iterable)
+
+
+def write(path):
+    if not collector.enabled:
+        raise RuntimeError("Instrumentation is disabled; call instrumentation.enable() first")
+    return collector.write(path)
@@ -0,0 +1,110 @@
+import math
+import numpy as np
+
+# Complementary filter: the gyro rate is integrated for short-term motion and
+# pulled towards the accelerometer angle with time constant `tau`:
+#
+#   a_k     = tau / (tau + dt_k)
+#   theta_k = a_k * (theta_{k-1} + sign * rate_k * dt_k) + (1 - a_k) * phi_k
+#
+# where phi_k = degrees(atan2(accel_x, accel_z)) is the old accel-only lean.
+# The result is used as abs(theta), the same quantity and range the `lean`
+# antecedent already expects.
+#
+# With the MPU6050 mounted as in imu.py, atan2(accel_x, accel_z) turns the
+# opposite way to a positive gyro_y rate, hence sign = -1 by default.
+
+DEFAULT_TAU = 0.5          # seconds
+DEFAULT_GYRO_AXIS = 'y'
+DEFAULT_GYRO_SIGN = -1.0
+
+
+class ComplementaryLeanEstimator:
+    # O(1) per-sample lean for the live path; state is (theta, t)
+    def __init__(self, tau=DEFAULT_TAU, gyro_axis=DEFAULT_GYRO_AXIS, gyro_sign=DEFAULT_GYRO_SIGN):
+        self.tau = tau
+        self.gyro_axis = gyro_axis
+        self.gyro_sign = gyro_sign
+        self.theta = None
+        self.t = None
+
+    @property
+    def state(self):
+        return (self.theta, self.t)
+
+    def update(self, accel_x, accel_z, gyro_rate, t):
+        # gyro_rate in deg/s about gyro_axis, t in seconds; returns abs(lean)
+        phi = math.degrees(math.atan2(accel_x, accel_z))
+        if self.theta is None:
+            self.theta = phi
+        else:
+            dt = max(t - self.t, 0.0)
+            a = self.tau / (self.tau + dt)
+            self.theta = a * (self.theta + self.gyro_sign * gyro_rate * dt) + (1.0 - a) * phi
+        self.t = t
+        return abs(self.theta)
+
+    def update_sample(self, data, t):
+        # Convenience for MPU6050.get_motion_data() / replay sources
+        return self.update(data["accel"]['x'], data["accel"]['z'], data["gyro"][self.gyro_axis], t)
+
+
+def _affine_scan(a, b):
+    # theta_k = a_k * theta_{k-1} + b_k for all k at once (theta_{-1} = 0),
+    # by composing the affine maps with a log2(n)-step doubling scan.
+    a = a.copy()
+    b = b.copy()
+    shift = 1
+    while shift < len(a):
+        b[shift:] = a[shift:] * b[:-shift] + b[shift:]
+        a[shift:] = a[shift:] * a[:-shift]
+        shift *= 2
+    return b
+
+
+def estimate_lean(accel_x, accel_z, gyro_rate, t, tau=DEFAULT_TAU, gyro_sign=DEFAULT_GYRO_SIGN, state=None):
+    # Vectorized twin of ComplementaryLeanEstimator for a whole *_imu.csv (or
+    # one chunk of it). `state` is the (theta, t) left by the previous chunk
+    # or by a streaming estimator; returns (abs lean array, new state).
+    # Agrees with the streaming estimator to floating-point rounding
+    # (< 1e-9 degrees).
+    accel_x = np.asarray(accel_x, dtype=float)
+    accel_z = np.asarray(accel_z, dtype=float)
+    gyro_rate = np.asarray(gyro_rate, dtype=float)
+    t = np.asarray(t, dtype=float)
+    n = len(t)
+    if n == 0:
+        return np.zeros(0), state
+
+    phi = np.degrees(np.arctan2(accel_x, accel_z))
+    theta_prev, t_prev = state if state is not None else (None, None)
+    dt = np.empty(n)
+    dt[1:] = np.diff(t)
+    dt[0] = t[0] - t_prev if theta_prev is not None else 0.0
+    dt = np.maximum(dt, 0.0)
+
+    a = tau / (tau + dt)
+    b = a * gyro_sign * gyro_rate * dt + (1.0 - a) * phi
+    if theta_prev is None:
+        a[0], b[0] = 0.0, phi[0]
+    else:
+        b[0] += a[0] * theta_prev
+        a[0] = 0.0
+
+    theta = _affine_scan(a, b)
+    return np.abs(theta), (float(theta[-1]), float(t[-1]))
+
+
+def lean_from_imu(imu_df, method='accel', tau=DEFAULT_TAU, gyro_axis=DEFAULT_GYRO_AXIS,
+                  gyro_sign=DEFAULT_GYRO_SIGN, state=None):
+    # Lean column for a *_imu.csv frame. 'accel' is the original
+    # abs(degrees(arctan2(accel_x, accel_z))); 'fusion' uses the filter and
+    # needs the timestamp and gyro columns. Returns (lean, state).
+    if method == 'accel':
+        return np.abs(np.degrees(np.arctan2(imu_df["accel_x"].to_numpy(dtype=float),
+                                            imu_df["accel_z"].to_numpy(dtype=float)))), None
+    elif method == 'fusion':
+        from time_alignment import parse_imu_time
+        return estimate_lean(imu_df["accel_x"], imu_df["accel_z"], imu_df["gyro_" + gyro_axis],
+                             parse_imu_time(imu_df["timestamp"]), tau=tau, gyro_sign=gyro_sign, state=state)
+    raise ValueError(f"Unknown lean method '{method}', expected 'accel' or 'fusion'")
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import csv
+import math
+import time
+from collections import deque
+from datetime import datetime
+from batch_inference import INPUT_VARIABLES, INPUT_COLUMNS, safety_label
+from instrumentation import count, observe
+
+OBD_VARIABLES = [v for v in INPUT_VARIABLES if v != 'lean']
+RESULT_HEADER = ["timestamp"] + [INPUT_COLUMNS[v] for v in INPUT_VARIABLES] + ["Safety Score", "Safety Label"]
+
+
+class ReplayImuSource:
+    # Serves a recorded *_imu.csv through the same get_motion_data() call as
+    # imu.MPU6050, so the daemon runs on a dev box. status 404 = end of log.
+    # Each sample also carries "t", its time in the recording (seconds since
+    # the first row, still increasing when the replay loops), which the
+    # daemon uses as the sample clock instead of its own pacing.
+    def __init__(self, path, loop=False):
+        self.rows, self.times = [], []
+        with open(path, newline='') as f:
+            for r in csv.DictReader(f):
+                self.rows.append((float(r['accel_x']), float(r['accel_y']), float(r['accel_z']),
+                                  float(r['gyro_x']), float(r['gyro_y']), float(r['gyro_z'])))
+                self.times.append(datetime.fromisoformat(r['timestamp']).timestamp())
+        if self.times:
+            self.times = [t - self.times[0] for t in self.times]
+        gaps = [b - a for a, b in zip(self.times, self.times[1:])]
+        self.lap_s = self.times[-1] + sorted(gaps)[len(gaps) // 2] if gaps else 1.0
+        self.loop = loop
+        self.position = 0
+        self.laps = 0
+
+    def get_motion_data(self):
+        if self.position >= len(self.rows):
+            if not self.loop or not self.rows:
+                return {"status": 404, "message": "Replay exhausted"}
+            self.position = 0
+            self.laps += 1
+        ax, ay, az, gx, gy, gz = self.rows[self.position]
+        t = self.laps * self.lap_s + self.times[self.position]
+        self.position += 1
+        return {"status": 200, "accel": {'x': ax, 'y': ay, 'z': az}, "gyro": {'x': gx, 'y': gy, 'z': gz}, "t": t}
+
+
+class ReplayObdSource:
+    # Latest-value OBD source replaying safe_riding.csv-style exports; one row
+    # every `interval_s` seconds of sample time (see LiveScoringDaemon), so
+    # the pairing with the IMU does not depend on how fast the replay runs.
+    # Any object with a latest(t_s) -> {variable: value} method can stand in
+    # for it.
+    def __init__(self, path, interval_s=1.0, loop=True):
+        with open(path, newline='') as f:
+            self.rows = [{v: _float(r.get(INPUT_COLUMNS[v])) for v in OBD_VARIABLES} for r in csv.DictReader(f)]
+        self.interval_s = interval_s
+        self.loop = loop
+
+    def latest(self, t_s):
+        i = int(t_s / self.interval_s)
+        if self.loop:
+            i %= len(self.rows)
+        return self.rows[min(i, len(self.rows) - 1)]
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def accel_lean(ax, az):
+    return abs(math.degrees(math.atan2(ax, az)))
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+class LiveScoringDaemon:
+    # Sensor reads, scoring and logging run as separate asyncio tasks joined
+    # by bounded queues. Sampling never waits on a consumer: when the score
+    # queue or the log queue is full the oldest entry is dropped and counted,
+    # so a slow SD card costs log rows, not samples. Latency is measured from
+    # sensor read to score emission against `latency_budget_ms`.
+    #
+    # OBD rows and the lean filter follow the sample clock: the sample's own
+    # "t" when the source has one (replayed logs), else sample index x
+    # `sample_interval_s` when given, else time since start (a live sensor).
+    # A replay therefore pairs the same IMU and OBD rows at any rate.
+
+    def __init__(self, scorer, imu_source, obd_source, rate_hz=50.0, out_file=None, queue_size=256,
+                 latency_budget_ms=20.0, log_batch=64, on_score=None, window=10000, lean_estimator=None,
+                 sample_interval_s=None):
+        # lean_estimator: e.g. lean_estimator.ComplementaryLeanEstimator();
+        # None keeps the accelerometer-only lean
+        # on_score(timestamp, score, label, latency_ms, t_sample): t_sample is
+        # the sample clock (seconds), the time base for rolling windows
+        self.scorer = scorer
+        self.sample_interval_s = sample_interval_s
+        self.lean_estimator = lean_estimator
+        self.imu_source = imu_source
+        self.obd_source = obd_source
+        self.rate_hz = rate_hz
+        self.out_file = out_file
+        self.latency_budget_ms = latency_budget_ms
+        self.log_batch = log_batch
+        self.on_score = on_score
+        self._samples = asyncio.Queue(maxsize=queue_size)
+        self._log = asyncio.Queue(maxsize=queue_size)
+        self.latencies_ms = deque(maxlen=window)
+        self.counters = {"samples": 0, "read_errors": 0, "scored": 0, "no_result": 0,
+                         "dropped_samples": 0, "dropped_log_rows": 0, "over_budget": 0, "logged": 0}
+
+    @staticmethod
+    def _put_latest(queue, item):
+        # Non-blocking put; evicts the oldest entry when full. Returns True
+        # when something was evicted.
+        dropped = False
+        if queue.full():
+            queue.get_nowait()
+            queue.task_done()
+            dropped = True
+        queue.put_nowait(item)
+        return dropped
+
+    async def _sensor_task(self, max_samples):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.rate_hz if self.rate_hz else 0.0
+        start = loop.time()
+        tick = 0
+        while max_samples is None or tick < max_samples:
+            if period:
+                # Drift-free pacing on the loop's monotonic clock
+                await asyncio.sleep(max(0.0, start + tick * period - loop.time()))
+            else:
+                await asyncio.sleep(0)
+            tick += 1
+            data = self.imu_source.get_motion_data()
+            t_read = time.perf_counter()
+            if data["status"] == 404:
+                break
+            if data["status"] != 200:
+                self.counters["read_errors"] += 1
+                continue
+            if "t" in data:
+                t_sample = data["t"]
+            elif self.sample_interval_s:
+                t_sample = self.counters["samples"] * self.sample_interval_s
+            else:
+                t_sample = loop.time() - start
+            self.counters["samples"] += 1
+            if self._put_latest(self._samples, (t_read, t_sample, datetime.now().isoformat(), data)):
+                self.counters["dropped_samples"] += 1
+        await self._samples.put(None)
+
+    async def _scoring_task(self):
+        while True:
+            item = await self._samples.get()
+            self._samples.task_done()
+            if item is None:
+                break
+            t_read, t_sample, timestamp, data = item
+            a = data["accel"]
+            values = dict(self.obd_source.latest(t_sample))
+            if self.lean_estimator is None:
+                values['lean'] = accel_lean(a['x'], a['z'])
+            else:
+                values['lean'] = self.lean_estimator.update_sample(data, t_sample)
+            inputs = [values[v] for v in self.scorer.input_names]
+            score = self.scorer.score(inputs)
+            rounded = None if score is None else int(round(score))
+            label = safety_label(rounded)
+
+            latency_ms = (time.perf_counter() - t_read) * 1000.0
+            self.latencies_ms.append(latency_ms)
+            observe("sample_latency_us", latency_ms * 1000.0)
+            count("rows_scored")
+            self.counters["scored"] += 1
+            if rounded is None:
+                missing = all(math.isnan(x) for x in inputs)
+                count("no_result_rows", reason="all_inputs_missing" if missing else "no_rule_fired")
+                self.counters["no_result"] += 1
+            if latency_ms > self.latency_budget_ms:
+                self.counters["over_budget"] += 1
+            if self.on_score is not None:
+                self.on_score(timestamp, rounded, label, latency_ms, t_sample)
+            row = [timestamp] + [values[v] for v in INPUT_VARIABLES] + [rounded, label]
+            if self._put_latest(self._log, row):
+                self.counters["dropped_log_rows"] += 1
+            await asyncio.sleep(0)
+        await self._log.put(None)
+
+    async def _logger_task(self):
+        loop = asyncio.get_running_loop()
+        out = open(self.out_file, 'w', newline='') if self.out_file else None
+        writer = csv.writer(out) if out else None
+        if writer:
+            writer.writerow(RESULT_HEADER)
+        try:
+            done = False
+            while not done:
+                batch = [await self._log.get()]
+                self._log.task_done()
+                while len(batch) < self.log_batch and not self._log.empty():
+                    batch.append(self._log.get_nowait())
+                    self._log.task_done()
+                if batch[-1] is None:
+                    batch.pop()
+                    done = True
+                if writer and batch:
+                    # File I/O off the event loop so a slow disk cannot stall sampling
+                    await loop.run_in_executor(None, writer.writerows, batch)
+                self.counters["logged"] += len(batch)
+        finally:
+            if out:
+                out.close()
+
+    async def run(self, max_samples=None):
+        await asyncio.gather(self._sensor_task(max_samples), self._scoring_task(), self._logger_task())
+        return self.stats()
+
+    def stats(self):
+        lat = list(self.latencies_ms)
+        return {
+            **self.counters,
+            "latency_budget_ms": self.latency_budget_ms,
+            "latency_p50_ms": percentile(lat, 50),
+            "latency_p95_ms": percentile(lat, 95),
+            "latency_p99_ms": percentile(lat, 99),
+            "latency_max_ms": max(lat) if lat else None
+        }
+
+
+def build_scorer():
+    from compiled_model import load_or_compile
+    from sparse_scorer import SparseScorer
+    return SparseScorer(load_or_compile())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live safety scoring from the IMU and an OBD source")
+    parser.add_argument("--rate", type=float, default=50.0, help="sampling rate in Hz (0 = unthrottled replay)")
+    parser.add_argument("--replay-imu", help="replay a recorded *_imu.csv instead of the MPU6050")
+    parser.add_argument("--obd", default="safe_riding.csv", help="OBD export to replay")
+    parser.add_argument("--obd-interval", type=float, default=1.0, help="seconds per OBD row")
+    parser.add_argument("--samples", type=int, default=None, help="stop after N samples")
+    parser.add_argument("--out", default="Result/live_scores.csv")
+    parser.add_argument("--budget-ms", type=float, default=20.0)
+    parser.add_argument("--lean", default="accel", choices=["accel", "fusion"],
+                        help="accelerometer-only lean or gyro/accel complementary filter")
+    parser.add_argument("--model", help="score with a model spec (see model_spec.py), reloaded when it changes")
+    parser.add_argument("--monitor", action="store_true",
+                        help="rolling-window analytics with alerts (see rolling_analytics.py)")
+    args = parser.parse_args()
+
+    if args.model:
+        from model_spec import HotReloadScorer
+        scorer = HotReloadScorer(args.model, on_reload=lambda e: print(f"Model reload: {e}")).start()
+    else:
+        scorer = build_scorer()
+    obd_source = ReplayObdSource(args.obd, interval_s=args.obd_interval)
+    if args.replay_imu:
+        imu_source = ReplayImuSource(args.replay_imu)
+        closer = None
+    else:
+        from imu import MPU6050
+        imu_source = closer = MPU6050(verbose=True)
+        if imu_source.bus is None:
+            raise SystemExit("MPU6050 not available")
+
+    estimator = None
+    if args.lean == "fusion":
+        from lean_estimator import ComplementaryLeanEstimator
+        estimator = ComplementaryLeanEstimator()
+    monitor = on_score = None
+    if args.monitor:
+        from rolling_analytics import SessionMonitor
+        monitor = SessionMonitor(on_alert=lambda e: print(f"ALERT {e['alert']} {e['state']} ({e['value']:.2f})"))
+        on_score = lambda timestamp, score, label, latency_ms, t_sample: monitor.update(t_sample, score, label)
+    daemon = LiveScoringDaemon(scorer, imu_source, obd_source, rate_hz=args.rate, out_file=args.out,
+                               latency_budget_ms=args.budget_ms, lean_estimator=estimator, on_score=on_score)
+    try:
+        stats = asyncio.run(daemon.run(max_samples=args.samples))
+    except KeyboardInterrupt:
+        stats = daemon.stats()
+    finally:
+        if closer is not None:
+            closer.close()
+        if args.model:
+            scorer.stop()
+
+    print("Live scoring stopped.")
+    for key, value in stats.items():
+        print(f"- {key}: {value}")
+    if monitor is not None:
+        print(f"- rolling: {monitor.snapshot()}")
@@ -0,0 +1,271 @@
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from columnar_io import iter_table
+
+# Same columns and short names as data_preperation.py
+SELECTED_VARS = {
+    'Vehicle speed (km/h)': 'speed',
+    'Engine RPM (rpm)': 'rpm',
+    'Calculated engine load value (%)': 'acceleration',
+    'Relative throttle position (%)': 'throttle',
+    'Instant engine power (based on fuel consumption) (hp)': 'power',
+    'Intake manifold absolute pressure (psi)': 'intake_pressure'
+}
+
+STAT_ROWS = ['min', 'q1', 'median', 'q3', 'max']
+STAT_QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+SKETCH_FORMAT_VERSION = 1
+
+
+class QuantileSketch:
+    # Merging t-digest: values are buffered, then folded into about
+    # `compression` weighted centroids whose size shrinks towards the tails
+    # (arcsine scale), so quartiles stay accurate in O(compression) memory.
+    # Two sketches merge by pooling their centroids, in any order.
+    # Exact min/max are tracked on the side. Up to `compression` values
+    # nothing is merged, so quantiles equal pandas' linear interpolation.
+
+    def __init__(self, compression=500, buffer_size=10000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def count(self):
+        self._flush()
+        return float(self.weights.sum())
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]  # describe() skips NaN as well
+        if len(values) == 0:
+            return self
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.buffer_size:
+            self._flush()
+        return self
+
+    def merge(self, other):
+        other._flush()
+        self._flush()
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        values = np.concatenate(self._buffer)
+        self._buffer, self._buffered = [], 0
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        if len(means) <= self.compression:
+            # Small enough to keep as is (exact quantiles for small inputs)
+            self.means, self.weights = means, weights
+            return
+        # Centroid boundaries where the scale function k(q) crosses an integer
+        q_mid = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / np.pi * np.arcsin(2 * q_mid - 1)
+        bucket = np.floor(k)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        w = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / w
+        self.weights = w
+
+    def quantile(self, qs):
+        # Linear interpolation on rank positions, like DataFrame.quantile:
+        # a centroid of weight w starting at rank c sits at rank c + (w - 1) / 2
+        self._flush()
+        qs = np.asarray(qs, dtype=float)
+        n = self.weights.sum()
+        if n == 0:
+            return np.full(qs.shape, np.nan)
+        left = np.cumsum(self.weights) - self.weights
+        ranks = np.r_[0.0, left + (self.weights - 1) / 2, n - 1]
+        values = np.r_[self.min, self.means, self.max]
+        return np.interp(qs * (n - 1), ranks, values)
+
+    def to_arrays(self):
+        self._flush()
+        return np.vstack([self.means, self.weights]), np.array([self.min, self.max, self.compression])
+
+    @classmethod
+    def from_arrays(cls, centroids, bounds):
+        sketch = cls(compression=int(bounds[2]))
+        sketch.means, sketch.weights = centroids[0].copy(), centroids[1].copy()
+        sketch.min, sketch.max = float(bounds[0]), float(bounds[1])
+        return sketch
+
+
+class CalibrationSketch:
+    # One QuantileSketch per OBD column plus the list of files already folded
+    # in, so a saved shard can be updated with only the new rides.
+
+    def __init__(self, columns=None, compression=500):
+        self.columns = list(columns or SELECTED_VARS)
+        self.sketches = {c: QuantileSketch(compression) for c in self.columns}
+        self.files = {}
+
+    def add_frame(self, df):
+        for c in self.columns:
+            self.sketches[c].add(pd.to_numeric(df[c], errors='coerce').to_numpy(dtype=float))
+        return self
+
+    def add_file(self, path, chunk_size=100000):
+        # CSV, Parquet or Feather (by extension); only the sketched columns are read
+        key = os.path.abspath(path)
+        if key in self.files:
+            return False
+        rows = 0
+        for chunk in iter_table(path, self.columns, chunk_size=chunk_size):
+            self.add_frame(chunk)
+            rows += len(chunk)
+        self.files[key] = rows
+        return True
+
+    def merge(self, other):
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge calibration sketches over different columns")
+        for path in other.files:
+            if path in self.files:
+                raise ValueError(f"{path} is already included in this sketch")
+        for c in self.columns:
+            self.sketches[c].merge(other.sketches[c])
+        self.files.update(other.files)
+        return self
+
+    def stats(self):
+        # Same layout as the describe()-based table in data_preperation.py
+        return pd.DataFrame({c: self.sketches[c].quantile(STAT_QUANTILES) for c in self.columns},
+                            index=STAT_ROWS)
+
+    def save(self, path):
+        arrays = {}
+        for i, c in enumerate(self.columns):
+            arrays[f"centroids_{i}"], arrays[f"bounds_{i}"] = self.sketches[c].to_arrays()
+        meta = {"version": SKETCH_FORMAT_VERSION, "columns": self.columns, "files": self.files}
+        # Through a file handle so the sketch lands at `path` exactly (np.savez
+        # would append .npz to any other name); load() reads it back by content
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != SKETCH_FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {SKETCH_FORMAT_VERSION} calibration sketch")
+            calibration = cls(meta["columns"])
+            for i, c in enumerate(calibration.columns):
+                calibration.sketches[c] = QuantileSketch.from_arrays(data[f"centroids_{i}"], data[f"bounds_{i}"])
+        calibration.files = meta["files"]
+        return calibration
+
+
+def mf_parameters(stats, selected_vars=None):
+    # Low / Medium / High trimf parameters from the five-number summary;
+    # data_preperation.py builds output_fuzzy_mf_parameters_safe.csv with this
+    mf_params = []
+    for col, short_name in (selected_vars or SELECTED_VARS).items():
+        minv = stats.loc['min', col]
+        q1 = stats.loc['q1', col]
+        median = stats.loc['median', col]
+        q3 = stats.loc['q3', col]
+        maxv = stats.loc['max', col]
+        mf_params += [
+            {'Variable': short_name, 'Label': 'Low',    'a': minv,   'b': minv,   'c': q1},
+            {'Variable': short_name, 'Label': 'Medium', 'a': q1,     'b': median, 'c': q3},
+            {'Variable': short_name, 'Label': 'High',   'a': median, 'b': maxv,   'c': maxv}
+        ]
+    return pd.DataFrame(mf_params)
+
+
+def sketch_file(path, chunk_size=100000, compression=500):
+    calibration = CalibrationSketch(compression=compression)
+    calibration.add_file(path, chunk_size)
+    return calibration
+
+
+def expand_inputs(patterns):
+    paths = []
+    for pattern in patterns:
+        paths += sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+    return paths
+
+
+def calibrate(paths, sketch_path=None, workers=1, chunk_size=100000, compression=500):
+    # Folds every file not yet in the sketch at `sketch_path` (if any) into
+    # it, one process per file when workers > 1, and saves it back.
+    if sketch_path and os.path.exists(sketch_path):
+        calibration = CalibrationSketch.load(sketch_path)
+    else:
+        calibration = CalibrationSketch(compression=compression)
+    pending = [p for p in dict.fromkeys(paths) if os.path.abspath(p) not in calibration.files]
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for shard in pool.map(sketch_file, pending, [chunk_size] * len(pending),
+                                  [compression] * len(pending)):
+                calibration.merge(shard)
+    else:
+        for path in pending:
+            calibration.add_file(path, chunk_size)
+
+    if sketch_path:
+        calibration.save(sketch_path)
+    return calibration, pending
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate fuzzy MF parameters from OBD exports with "
+                                                 "streaming quantile sketches")
+    parser.add_argument("inputs", nargs="*", help="OBD exports (CSV / Parquet / Feather) or glob patterns to fold in")
+    parser.add_argument("--sketch", help="sketch file to update incrementally (created if missing)")
+    parser.add_argument("--merge", nargs="+", default=[], help="shard sketches to combine with the inputs")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--compression", type=int, default=500)
+    parser.add_argument("--mf-out", default="output_fuzzy_mf_parameters_safe.csv")
+    parser.add_argument("--stats-out", default="output_descriptive_stats_safe.csv")
+    args = parser.parse_args()
+
+    calibration, added = calibrate(expand_inputs(args.inputs), args.sketch, args.workers, args.chunk_size,
+                                   args.compression)
+    for shard in args.merge:
+        calibration.merge(CalibrationSketch.load(shard))
+    if args.sketch and args.merge:
+        calibration.save(args.sketch)
+    if not calibration.files:
+        raise SystemExit("No OBD data to calibrate from.")
+
+    stats = calibration.stats()
+    stats.to_csv(args.stats_out)
+    mf_parameters(stats).to_csv(args.mf_out, index=False)
+
+    print("MF calibration complete.")
+    print(f"- {len(added)} new file(s), {len(calibration.files)} in total, "
+          f"{sum(calibration.files.values())} rows.")
+    print(f"- {args.stats_out}")
+    print(f"- {args.mf_out}")
@@ -0,0 +1,390 @@
+import argparse
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from batch_inference import INPUT_COLUMNS, INPUT_VARIABLES, MODES, FuzzyBatchEngine, _trimf, safety_label
+from columnar_io import read_table
+from compiled_model import MODEL_FILE, engine_hash, load_or_compile, save_engine
+from lean_estimator import lean_from_imu
+from mf_calibration import SELECTED_VARS
+from model_spec import spec_from_engine, write_spec
+
+# The CSV-derived inputs; lean keeps its hand-set MFs
+TUNED_VARIABLES = list(SELECTED_VARS.values())
+LABELS = ['low', 'medium', 'high']
+
+# Invalid ("No Result") rows cost this much objective per unit fraction
+NO_RESULT_PENALTY = 2.0
+
+# Smallest distance between neighbouring knots, as a fraction of the universe
+MIN_KNOT_GAP = 0.01
+
+_evaluator = None
+
+
+def knots_to_params(knots):
+    # Five ordered knots (min, q1, median, q3, max) -> Low / Medium / High
+    # trimfs, the same construction data_preperation.py uses
+    k0, k1, k2, k3, k4 = knots
+    return [[k0, k0, k1], [k1, k2, k3], [k2, k4, k4]]
+
+
+def params_to_knots(params):
+    (k0, _, k1), (_, k2, k3), (_, k4, _) = params
+    return np.array([k0, k1, k2, k3, k4], dtype=float)
+
+
+def load_labelled(safe_file="safe_riding.csv", aggressive_file="aggressive_riding.csv",
+                  imu_file="20250601_142500_imu.csv", events=None, lean_method='accel'):
+    # Rows of both exports as one input matrix; y = 0 safe, 1 aggressive.
+    # Lean comes from the IMU log paired by row index, as in Build_simulation.py.
+    # Any of the files may be CSV, Parquet or Feather.
+    # `events` restricts the aggressive set to those riding_event values.
+    imu_df = read_table(imu_file)
+    lean = lean_from_imu(imu_df, lean_method)[0]
+    frames = []
+    for path, y in [(safe_file, 0), (aggressive_file, 1)]:
+        df = read_table(path)
+        n = min(len(df), len(lean))
+        df = df.iloc[:n].copy()
+        df['lean'] = lean[:n]
+        if 'riding_event' not in df:
+            df['riding_event'] = 'safe'
+        if y == 1 and events:
+            df = df[df['riding_event'].isin(events)]
+        df['y'] = y
+        frames.append(df)
+    data = pd.concat(frames, ignore_index=True)
+    X = data[[INPUT_COLUMNS[name] for name in INPUT_VARIABLES]].to_numpy(dtype=float)
+    return X, data['y'].to_numpy(), data['riding_event'].to_numpy()
+
+
+def split_rows(events, validation=0.3, block=20, seed=0):
+    # Boolean training mask. The rows of each riding_event are cut into
+    # contiguous blocks of `block` rows and a `validation` share of the
+    # blocks is held out, so every event is represented on both sides and
+    # neighbouring (near-identical) samples do not land on both.
+    rng = np.random.default_rng(seed)
+    train = np.ones(len(events), dtype=bool)
+    for event in pd.unique(events):
+        rows = np.flatnonzero(events == event)
+        blocks = np.array_split(rows, max(1, -(-len(rows) // block)))
+        n_val = int(round(validation * len(blocks)))
+        if validation > 0 and len(blocks) > 1:
+            n_val = min(max(n_val, 1), len(blocks) - 1)
+        for i in rng.choice(len(blocks), size=n_val, replace=False):
+            train[blocks[i]] = False
+    return train
+
+
+def auc(scores, y):
+    # P(aggressive row scores above a safe row), ties count half
+    safe = np.sort(scores[y == 0])
+    aggressive = scores[y == 1]
+    if len(safe) == 0 or len(aggressive) == 0:
+        return float('nan')
+    below = np.searchsorted(safe, aggressive, side='left')
+    equal = np.searchsorted(safe, aggressive, side='right') - below
+    return float((below + 0.5 * equal).sum() / (len(safe) * len(aggressive)))
+
+
+def separation(scores, valid, y):
+    # Standardized gap between the aggressive and safe mean scores, minus a
+    # penalty for rows that produce no result
+    s0, s1 = scores[valid & (y == 0)], scores[valid & (y == 1)]
+    if len(s0) < 2 or len(s1) < 2:
+        return -np.inf, {}
+    pooled = np.sqrt((s0.var() + s1.var()) / 2) + 1e-6
+    no_result = 1.0 - valid.mean()
+    objective = (s1.mean() - s0.mean()) / pooled - NO_RESULT_PENALTY * no_result
+    return float(objective), {
+        'objective': float(objective),
+        'mean_safe': float(s0.mean()),
+        'mean_aggressive': float(s1.mean()),
+        'auc': auc(scores[valid], y[valid]),
+        'no_result': float(no_result)
+    }
+
+
+class CandidateEvaluator:
+    # Scores candidate MF sets the way the engine's mode does: 'grid'
+    # interpolates MFs sampled on the universes (what tuned_engine() builds)
+    # and takes the sampled centroid, 'analytic' uses the exact triangles.
+    # The search therefore optimizes the scores the tuned model produces in
+    # that mode. Memberships are cached per (variable, knots) and rule
+    # strengths per full input parameter set, so candidates that only change
+    # rule consequents (the output side) skip fuzzification and rule firing.
+
+    def __init__(self, engine, X, y, cache_size=256):
+        self.engine = engine
+        self.X = X
+        self.y = y
+        self.cache_size = cache_size
+        self.var_index = {name: i for i, name in enumerate(engine.input_names)}
+        self.all_missing = np.isnan(X).all(axis=1)
+        self._memberships = OrderedDict()
+        self._strengths = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, cache, key, compute):
+        if key in cache:
+            cache.move_to_end(key)
+            self.hits += 1
+            return cache[key]
+        self.misses += 1
+        value = cache[key] = compute()
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return value
+
+    def membership(self, name, params=None):
+        # params=None: the engine's own MFs for this variable
+        def compute():
+            _, universe, _, mfs = self.engine.variables[self.var_index[name]]
+            x = np.clip(self.X[:, self.var_index[name]], universe[0], universe[-1])
+            if self.engine.mode == 'analytic':
+                return np.array([_trimf(x, a, b, c) for a, b, c in
+                                 (self.engine.mf_parameters[name] if params is None else params)])
+            if params is not None:
+                mfs = [_trimf(universe, a, b, c) for a, b, c in params]
+            return np.array([np.interp(x, universe, mf, left=0.0, right=0.0) for mf in mfs])
+        key = (name, None if params is None else tuple(np.ravel(params)))
+        return self._cached(self._memberships, key, compute)
+
+    def strengths(self, knots):
+        def compute():
+            memberships = []
+            for name in self.engine.input_names:
+                params = knots_to_params(knots[name]) if name in knots else None
+                memberships.append(self.membership(name, params))
+            return self.engine.rule_strengths(memberships, len(self.X))
+        key = tuple((name, tuple(knots[name])) for name in sorted(knots))
+        return self._cached(self._strengths, key, compute)
+
+    def score(self, knots, consequents=None):
+        cuts = self.engine.accumulate(self.strengths(knots), consequents)
+        if self.engine.mode == 'analytic':
+            scores, valid = self.engine.defuzzify_analytic(cuts)
+        else:
+            scores, valid = self.engine.defuzzify(cuts)
+        valid &= ~self.all_missing
+        return scores, valid
+
+    def evaluate(self, knots, consequents=None):
+        scores, valid = self.score(knots, consequents)
+        return separation(scores, valid, self.y)
+
+
+def _init_worker(variables, output, rules, mf_parameters, mode, X, y):
+    # Rebuilt from the parent's engine arrays, so workers score exactly the
+    # model tune() was given, in its mode
+    global _evaluator
+    engine = FuzzyBatchEngine(variables, output, rules, mf_parameters=mf_parameters, mode=mode)
+    _evaluator = CandidateEvaluator(engine, X, y)
+
+
+def _evaluate_group(knots, consequent_sets):
+    # One input-side candidate with any number of consequent variants; the
+    # rule strengths are computed once for the whole group
+    return [_evaluator.evaluate(knots, c) for c in consequent_sets]
+
+
+def _spread_knots(k, lo, hi):
+    # Sorted, inside [lo, hi] and at least MIN_KNOT_GAP of the universe apart,
+    # so no triangle collapses to a point
+    gap = MIN_KNOT_GAP * (hi - lo)
+    k = np.sort(np.clip(k, lo, hi))
+    for i in range(1, len(k)):
+        k[i] = max(k[i], k[i - 1] + gap)
+    k[-1] = min(k[-1], hi)
+    for i in range(len(k) - 2, -1, -1):
+        k[i] = min(k[i], k[i + 1] - gap)
+    return k
+
+
+def _mutate_knots(rng, knots, bounds, step):
+    # Perturbs one or two variables by `step` of their universe
+    knots = {name: k.copy() for name, k in knots.items()}
+    for name in rng.choice(list(knots), size=rng.integers(1, 3), replace=False):
+        lo, hi = bounds[name]
+        knots[name] = _spread_knots(knots[name] + rng.normal(0.0, step * (hi - lo), 5), lo, hi)
+    return knots
+
+
+def _mutate_consequents(rng, consequents, n_terms):
+    consequents = [list(c) for c in consequents]
+    r = rng.integers(len(consequents))
+    consequents[r] = [(int(rng.integers(n_terms)), w) for _, w in consequents[r]]
+    return consequents
+
+
+def tune(engine, X, y, generations=40, population=24, tune_rules=False, workers=None, seed=0,
+         step=0.08, log=print):
+    # (1 + lambda) evolutionary search over the five knots of every tuned
+    # variable (and optionally the rule consequents), starting from the
+    # current parameters. Each generation's candidates are evaluated in
+    # parallel; the step size shrinks when a generation brings no gain.
+    # Candidates are scored in engine.mode, the mode the result is reported in.
+    rng = np.random.default_rng(seed)
+    knots = {name: params_to_knots(engine.mf_parameters[name]) for name in TUNED_VARIABLES}
+    bounds = {name: (engine.variables[engine.input_names.index(name)][1][0],
+                     engine.variables[engine.input_names.index(name)][1][-1]) for name in TUNED_VARIABLES}
+    consequents = [list(c) for _, c in engine.rules]
+    n_terms = len(engine.output[2])
+
+    evaluator = CandidateEvaluator(engine, X, y)
+    best, best_metrics = evaluator.evaluate(knots, consequents)
+    history = [best]
+    log(f"Baseline objective {best:.4f}")
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(engine.variables, engine.output, engine.rules, engine.mf_parameters,
+                                         engine.mode, X, y))
+    try:
+        for gen in range(generations):
+            groups = []
+            if tune_rules:
+                # Output-side variants share the current inputs, so their rule
+                # strengths come from one cached evaluation
+                groups.append((knots, [_mutate_consequents(rng, consequents, n_terms)
+                                       for _ in range(population // 3)]))
+            while sum(len(c) for _, c in groups) < population:
+                groups.append((_mutate_knots(rng, knots, bounds, step), [consequents]))
+
+            results = pool.map(_evaluate_group, [g[0] for g in groups], [g[1] for g in groups])
+            improved = False
+            for (cand_knots, cand_sets), group_results in zip(groups, results):
+                for cand_consequents, (objective, metrics) in zip(cand_sets, group_results):
+                    if objective > best:
+                        best, best_metrics = objective, metrics
+                        knots, consequents = cand_knots, cand_consequents
+                        improved = True
+            if not improved:
+                step = max(step * 0.7, 0.005)
+            history.append(best)
+            log(f"Generation {gen + 1}/{generations}: objective {best:.4f}, step {step:.3f}")
+    finally:
+        pool.shutdown()
+    return knots, consequents, best_metrics, history
+
+
+def tuned_engine(engine, knots, consequents):
+    # Copy of the engine with the tuned MFs sampled on the original universes
+    # (what define_fuzzy_variables.py would build from the candidate CSV)
+    params = {name: np.array(p) for name, p in engine.mf_parameters.items()}
+    variables = []
+    for name, universe, labels, mfs in engine.variables:
+        if name in knots:
+            params[name] = np.array(knots_to_params(knots[name]))
+            mfs = np.array([_trimf(universe, a, b, c) for a, b, c in params[name]])
+        variables.append((name, universe, labels, mfs))
+    rules = [(program, c) for (program, _), c in zip(engine.rules, consequents)]
+    return type(engine)(variables, engine.output, rules, mf_parameters=params, mode=engine.mode)
+
+
+def candidate_frame(knots):
+    # Same layout as output_fuzzy_mf_parameters_safe.csv
+    rows = []
+    for name in TUNED_VARIABLES:
+        for label, (a, b, c) in zip(LABELS, knots_to_params(knots[name])):
+            rows.append({'Variable': name, 'Label': label.capitalize(), 'a': a, 'b': b, 'c': c})
+    return pd.DataFrame(rows)
+
+
+def summarize(engine, X, y, events):
+    # Report metrics, scored in engine.mode (the mode tune() optimized)
+    scores, valid = engine.score(X)
+    rounded = np.where(valid, np.round(scores), np.nan)
+    objective, metrics = separation(scores, valid, y)
+    unsafe = np.array([safety_label(None if np.isnan(s) else int(s)) in ("Unsafe", "Highly Unsafe")
+                       for s in rounded])
+    metrics['unsafe_safe_pct'] = 100 * unsafe[y == 0].mean()
+    metrics['unsafe_aggressive_pct'] = 100 * unsafe[y == 1].mean()
+    metrics['by_event'] = {e: float(np.nanmean(scores[(events == e) & valid])) for e in pd.unique(events)
+                           if ((events == e) & valid).any()}
+    return metrics
+
+
+def write_report(path, baseline, tuned, knots, base_knots, rule_changes, history, split=None, mode='grid'):
+    # baseline / tuned: {'train': metrics, 'validation': metrics}; the search
+    # only ever saw the training rows
+    lines = ["MF tuning report", ""]
+    lines += [f"Inference mode: {mode} (searched and reported)", ""]
+    if split:
+        lines += [f"Rows: {split['train']} train, {split['validation']} validation "
+                  f"(held-out blocks of {split['block']} rows)", ""]
+    lines.append(f"{'metric':<24}{'baseline':>12}{'tuned':>12}{'train base':>12}{'train tuned':>12}")
+    for key in ['objective', 'mean_safe', 'mean_aggressive', 'auc', 'no_result',
+                'unsafe_safe_pct', 'unsafe_aggressive_pct']:
+        lines.append(f"{key:<24}{baseline['validation'][key]:>12.4f}{tuned['validation'][key]:>12.4f}"
+                     f"{baseline['train'][key]:>12.4f}{tuned['train'][key]:>12.4f}")
+    lines += ["", "Validation mean score by riding_event (baseline -> tuned)"]
+    for event, value in tuned['validation']['by_event'].items():
+        lines.append(f"- {event}: {baseline['validation']['by_event'].get(event, float('nan')):.3f} -> {value:.3f}")
+    lines += ["", "Knots min / q1 / median / q3 / max (baseline -> tuned)"]
+    for name in TUNED_VARIABLES:
+        lines.append(f"- {name}: {np.round(base_knots[name], 3).tolist()} -> {np.round(knots[name], 3).tolist()}")
+    lines += ["", f"Rule consequent changes: {len(rule_changes)}"]
+    lines += [f"- rule {r + 1}: {old} -> {new}" for r, old, new in rule_changes]
+    lines += ["", "Training objective by generation: " + ", ".join(f"{h:.3f}" for h in history)]
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune MF breakpoints to separate safe from aggressive rides")
+    parser.add_argument("--safe", default="safe_riding.csv")
+    parser.add_argument("--aggressive", default="aggressive_riding.csv")
+    parser.add_argument("--imu", default="20250601_142500_imu.csv")
+    parser.add_argument("--events", nargs="+", help="only these riding_event values count as aggressive")
+    parser.add_argument("--generations", type=int, default=40)
+    parser.add_argument("--population", type=int, default=24)
+    parser.add_argument("--tune-rules", action="store_true", help="also search rule consequents")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per core")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", default="grid", choices=MODES,
+                        help="inference mode to tune and report in (grid: the production path)")
+    parser.add_argument("--validation", type=float, default=0.3, help="share of rows held out from the search")
+    parser.add_argument("--block", type=int, default=20, help="rows per held-out block")
+    parser.add_argument("--out", default="Result/output_fuzzy_mf_parameters_tuned.csv")
+    parser.add_argument("--model-out", default="Result/fuzzy_model_tuned.npz",
+                        help="tuned model, loadable with compiled_model.load_engine()")
+    parser.add_argument("--spec-out", default="Result/fuzzy_model_tuned.json",
+                        help="tuned model as a spec for model_spec.py (.json / .yaml)")
+    parser.add_argument("--report", default="Result/mf_tuning_report.txt")
+    args = parser.parse_args()
+
+    engine = load_or_compile(MODEL_FILE, mode=args.mode)
+    X, y, events = load_labelled(args.safe, args.aggressive, args.imu, args.events)
+    train = split_rows(events, args.validation, args.block, args.seed)
+    base_knots = {name: params_to_knots(engine.mf_parameters[name]) for name in TUNED_VARIABLES}
+
+    knots, consequents, _, history = tune(engine, X[train], y[train], args.generations, args.population,
+                                          args.tune_rules, args.workers, args.seed)
+
+    out_labels = engine.output[2]
+    rule_changes = [(r, [out_labels[k] for k, _ in old], [out_labels[k] for k, _ in new])
+                    for r, ((_, old), new) in enumerate(zip(engine.rules, consequents)) if old != new]
+    tuned_model = tuned_engine(engine, knots, consequents)
+    parts = {'train': train, 'validation': ~train}
+    baseline = {part: summarize(engine, X[rows], y[rows], events[rows]) for part, rows in parts.items()}
+    tuned = {part: summarize(tuned_model, X[rows], y[rows], events[rows]) for part, rows in parts.items()}
+
+    for path in [args.out, args.model_out, args.spec_out, args.report]:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    candidate_frame(knots).to_csv(args.out, index=False)
+    save_engine(tuned_model, args.model_out, model_hash=engine_hash(tuned_model))
+    write_spec(spec_from_engine(tuned_model), args.spec_out)
+    write_report(args.report, baseline, tuned, knots, base_knots, rule_changes, history,
+                 {'train': int(train.sum()), 'validation': int((~train).sum()), 'block': args.block}, args.mode)
+
+    print("MF tuning complete.")
+    print(f"- Validation separation: {baseline['validation']['objective']:.3f} -> "
+          f"{tuned['validation']['objective']:.3f} (AUC {baseline['validation']['auc']:.3f} -> "
+          f"{tuned['validation']['auc']:.3f})")
+    print(f"- Candidate MF parameters saved to: {args.out}")
+    print(f"- Tuned model saved to: {args.model_out} and {args.spec_out}")
+    print(f"- Report saved to: {args.report}")
@@ -0,0 +1,386 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+from batch_inference import OP_AND, OP_NOT, OP_OR, OP_TERM, INPUT_VARIABLES, FuzzyBatchEngine, _trimf
+from instrumentation import count
+
+# Declarative model: universes, trimf terms and rules in one JSON (or YAML)
+# file, so the rule base and MF parameters can change without touching
+# define_fuzzy_*.py. Rules use skfuzzy's operators on "variable.term":
+#
+#   {"version": 1,
+#    "inputs": {"speed": {"universe": [0, 120, 100],
+#                         "terms": {"low": [0, 0, 8.37], "medium": [...], ...}}, ...},
+#    "output": {"name": "safety", "universe": [0, 10, 100], "terms": {...}},
+#    "rules": [{"if": "speed.high & lean.high", "then": "unsafe"},
+#              {"if": "~(rpm.low | throttle.low)", "then": {"unsafe": 0.5}}]}
+#
+# universe is [low, high, points] (np.linspace); "then" is a term, or
+# {term: weight} like skfuzzy's safety['unsafe'] % 0.5.
+SPEC_FORMAT_VERSION = 1
+SPEC_FILE = "fuzzy_model.json"
+
+_TOKEN = re.compile(r"\s*(?:([A-Za-z_]\w*)\.([A-Za-z_]\w*)|([&|~()]))")
+_BINARY = {'&': OP_AND, '|': OP_OR}
+_SYMBOL = {OP_AND: '&', OP_OR: '|'}
+_FLAT_LIST = re.compile(r"\[\s+([^\[\]{}]*?)\s+\]")
+
+
+def _tokens(text):
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            raise ValueError(f"Cannot parse rule '{text}' at position {pos}")
+        var, term, symbol = match.groups()
+        tokens.append((var, term) if var else symbol)
+        pos = match.end()
+    return tokens
+
+
+def parse_expression(text):
+    # "speed.high & ~(lean.low | rpm.low)" -> postfix [(var, term) | '&' | '|' | '~'].
+    # Precedence as in Python / skfuzzy: ~ over & over |.
+    tokens = _tokens(text)
+    pos = 0
+    out = []
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def binary(op, operand):
+        operand()
+        while peek() == op:
+            take()
+            operand()
+            out.append(op)
+
+    def either():
+        binary('|', both)
+
+    def both():
+        binary('&', unary)
+
+    def unary():
+        token = take() if peek() is not None else None
+        if token == '~':
+            unary()
+            out.append('~')
+        elif token == '(':
+            either()
+            if peek() != ')':
+                raise ValueError(f"Unbalanced parentheses in rule '{text}'")
+            take()
+        elif isinstance(token, tuple):
+            out.append(token)
+        else:
+            raise ValueError(f"Expected 'variable.term', '~' or '(' in rule '{text}'")
+
+    either()
+    if pos != len(tokens):
+        raise ValueError(f"Unexpected '{tokens[pos]}' in rule '{text}'")
+    return out
+
+
+def format_expression(program, variables):
+    # Inverse of parse_expression for a compiled program; the right operand
+    # of a binary op, and any operand using a different op, is parenthesized
+    stack = []
+    for op, v, t in program:
+        if op == OP_TERM:
+            stack.append((f"{variables[v][0]}.{variables[v][2][t]}", None))
+        elif op == OP_NOT:
+            text, inner = stack.pop()
+            stack.append((f"~({text})" if inner in _SYMBOL else f"~{text}", OP_NOT))
+        else:
+            (b, b_op), (a, a_op) = stack.pop(), stack.pop()
+            if a_op not in (None, OP_NOT, op):
+                a = f"({a})"
+            if b_op not in (None, OP_NOT):
+                b = f"({b})"
+            stack.append((f"{a} {_SYMBOL[op]} {b}", op))
+    return stack.pop()[0]
+
+
+def read_spec(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML model files need PyYAML (pip install pyyaml); use .json otherwise") from None
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def write_spec(spec, path):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            yaml.safe_dump(spec, f, sort_keys=False)
+        else:
+            # One line per term / universe so thresholds are easy to edit
+            f.write(_FLAT_LIST.sub(lambda m: "[" + ", ".join(re.split(r",\s+", m.group(1))) + "]",
+                                   json.dumps(spec, indent=2)) + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def _universe(universe):
+    return [float(universe[0]), float(universe[-1]), len(universe)]
+
+
+def spec_from_engine(engine):
+    # Declarative form of a compiled engine (e.g. the one load_or_compile()
+    # builds from define_fuzzy_*.py); needs its trimf parameters
+    if engine.mf_parameters is None:
+        raise ValueError("Exporting a model needs its trimf parameters")
+
+    def variable(name, universe, labels):
+        return {'universe': _universe(universe),
+                'terms': {label: [float(x) for x in p] for label, p in zip(labels, engine.mf_parameters[name])}}
+
+    out_name, out_universe, out_labels, _ = engine.output
+    rules = []
+    for program, consequent in engine.rules:
+        if len(consequent) == 1 and consequent[0][1] == 1.0:
+            then = out_labels[consequent[0][0]]
+        else:
+            then = {out_labels[k]: w for k, w in consequent}
+        rules.append({'if': format_expression(program, engine.variables), 'then': then})
+    return {'version': SPEC_FORMAT_VERSION,
+            'inputs': {name: variable(name, u, labels) for name, u, labels, _ in engine.variables},
+            'output': {'name': out_name, **variable(out_name, out_universe, out_labels)},
+            'rules': rules}
+
+
+def _variable_key(definition):
+    return json.dumps([definition.get('universe'), definition.get('terms')])
+
+
+def _compile_variable(name, definition):
+    try:
+        lo, hi, points = definition['universe']
+        terms = definition['terms']
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Variable '{name}' needs a [low, high, points] universe and terms") from None
+    if not hi > lo or int(points) < 2:
+        raise ValueError(f"Variable '{name}': bad universe {definition['universe']}")
+    if not terms:
+        raise ValueError(f"Variable '{name}' has no terms")
+    universe = np.linspace(float(lo), float(hi), int(points))
+    labels = list(terms)
+    params = np.array([[float(x) for x in terms[label]] for label in labels])
+    if params.shape[1] != 3 or np.any(params[:, 0] > params[:, 1]) or np.any(params[:, 1] > params[:, 2]):
+        raise ValueError(f"Variable '{name}': terms need trimf [a, b, c] with a <= b <= c")
+    mfs = np.array([_trimf(universe, a, b, c) for a, b, c in params])
+    return (name, universe, labels, mfs), params
+
+
+class ModelCompiler:
+    # Spec -> FuzzyBatchEngine, reusing what did not change since the last
+    # compile: a variable is resampled only when its universe or terms
+    # changed, a rule is parsed only when its expression is new. Rules are
+    # then re-indexed against the current term lists, which is cheap.
+
+    def __init__(self):
+        self._variables = {}    # name -> (definition key, compiled variable, params)
+        self._expressions = {}  # expression -> postfix program over names
+        self.last_changes = None
+
+    def _variable(self, name, definition, changed):
+        key = _variable_key(definition)
+        cached = self._variables.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, *_compile_variable(name, definition))
+            changed.append(name)
+        return cached
+
+    def _program(self, text, parsed):
+        if not isinstance(text, str):
+            raise ValueError(f"Rule condition must be a string, got {text!r}")
+        if text not in self._expressions:
+            self._expressions[text] = parse_expression(text)
+            parsed.append(text)
+        return self._expressions[text]
+
+    def compile(self, spec, mode='grid'):
+        if spec.get('version') != SPEC_FORMAT_VERSION:
+            raise ValueError(f"Model spec version {spec.get('version')}, expected {SPEC_FORMAT_VERSION}")
+        inputs, output = spec.get('inputs') or {}, spec.get('output') or {}
+        unknown = [name for name in inputs if name not in INPUT_VARIABLES]
+        if unknown:
+            raise ValueError(f"Unknown input variables {unknown}, expected some of {INPUT_VARIABLES}")
+        out_name = output.get('name', 'safety')
+
+        changed, parsed = [], []
+        compiled = {name: self._variable(name, inputs[name], changed) for name in INPUT_VARIABLES if name in inputs}
+        compiled[out_name] = self._variable(out_name, output, changed)
+        variables = [compiled[name][1] for name in INPUT_VARIABLES if name in inputs]
+        var_index = {v[0]: i for i, v in enumerate(variables)}
+        term_index = [{label: j for j, label in enumerate(v[2])} for v in variables]
+        out_index = {label: j for j, label in enumerate(compiled[out_name][1][2])}
+
+        rules = []
+        for n, rule in enumerate(spec.get('rules') or []):
+            program = []
+            for token in self._program(rule.get('if'), parsed):
+                if isinstance(token, tuple):
+                    var, term = token
+                    if var not in var_index or term not in term_index[var_index[var]]:
+                        raise ValueError(f"Rule {n + 1} uses unknown term '{var}.{term}'")
+                    program.append((OP_TERM, var_index[var], term_index[var_index[var]][term]))
+                else:
+                    program.append((OP_NOT if token == '~' else _BINARY[token], 0, 0))
+            then = rule.get('then')
+            then = {then: 1.0} if isinstance(then, str) else then or {}
+            if not then or any(term not in out_index for term in then):
+                raise ValueError(f"Rule {n + 1}: consequent {rule.get('then')!r} is not a term of '{out_name}'")
+            rules.append((program, [(out_index[term], float(w)) for term, w in then.items()]))
+        if not rules:
+            raise ValueError("Model spec has no rules")
+
+        # Keep only what the current spec uses, so the caches do not grow
+        # across reloads
+        self._variables = compiled
+        self._expressions = {rule['if']: self._expressions[rule['if']] for rule in spec['rules']}
+        self.last_changes = {'variables': changed, 'parsed_rules': len(parsed), 'rules': len(rules)}
+        params = {name: c[2] for name, c in compiled.items()}
+        return FuzzyBatchEngine(variables, compiled[out_name][1], rules, mf_parameters=params, mode=mode)
+
+
+def load_spec_engine(path=SPEC_FILE, mode='grid'):
+    return ModelCompiler().compile(read_spec(path), mode=mode)
+
+
+def _file_state(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class HotReloadScorer:
+    # Live scorer backed by a model spec that is watched for changes. A new
+    # version is compiled off to the side (incrementally, see ModelCompiler)
+    # and swapped in with one attribute assignment; score() reads that
+    # attribute once, so each sample is scored wholly by one engine and the
+    # samples already queued keep flowing through the swap. A spec that
+    # fails to load or compile is reported and the running engine is kept.
+    #
+    # input_names is fixed to INPUT_VARIABLES, so callers keep building the
+    # same value list even when a reload adds or drops inputs.
+
+    def __init__(self, path=SPEC_FILE, interval_s=1.0, on_reload=None, scorer_factory=None):
+        if scorer_factory is None:
+            from sparse_scorer import SparseScorer
+            scorer_factory = SparseScorer
+        self.path = path
+        self.interval_s = interval_s
+        self.on_reload = on_reload
+        self.scorer_factory = scorer_factory
+        self.input_names = list(INPUT_VARIABLES)
+        self.compiler = ModelCompiler()
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._state = _file_state(path)
+        self._active = self._build(read_spec(path))
+
+    def _build(self, spec):
+        engine = self.compiler.compile(spec)
+        picks = [INPUT_VARIABLES.index(name) for name in engine.input_names]
+        return self.scorer_factory(engine), picks, engine
+
+    @property
+    def engine(self):
+        return self._active[2]
+
+    def score(self, values):
+        scorer, picks, _ = self._active
+        return scorer.score([values[i] for i in picks])
+
+    def check(self):
+        # Reloads when the file changed since the last check; returns True
+        # when a new engine was swapped in
+        with self._lock:
+            try:
+                state = _file_state(self.path)
+            except OSError:
+                # Mid-replace by an editor; try again on the next check
+                return False
+            if state == self._state:
+                return False
+            self._state = state
+            start = time.perf_counter()
+            try:
+                active = self._build(read_spec(self.path))
+            except Exception as e:
+                self.reload_errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                count("model_reloads", result="error")
+                if self.on_reload is not None:
+                    self.on_reload({'status': 'error', 'error': self.last_error})
+                return False
+            self._active = active
+            self.reloads += 1
+            count("model_reloads", result="ok")
+            if self.on_reload is not None:
+                self.on_reload({'status': 'ok', 'compile_ms': (time.perf_counter() - start) * 1000.0,
+                                **self.compiler.last_changes})
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.interval_s):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="model-spec-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Declarative (JSON / YAML) fuzzy model spec")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="write the model built from define_fuzzy_*.py as a spec")
+    export_parser.add_argument("out", nargs="?", default=SPEC_FILE)
+    check_parser = sub.add_parser("check", help="validate a spec and compare it with the current model")
+    check_parser.add_argument("spec", nargs="?", default=SPEC_FILE)
+    check_parser.add_argument("--data", default="safe_riding.csv", help="OBD session scored by both models")
+    args = parser.parse_args()
+
+    from compiled_model import load_or_compile
+    engine = load_or_compile()
+    if args.command == "export":
+        write_spec(spec_from_engine(engine), args.out)
+        print(f"Exported {len(engine.rules)} rules over {len(engine.variables)} inputs to: {args.out}")
+    else:
+        from compare_inference import load_session
+        compiled = load_spec_engine(args.spec)
+        print(f"{args.spec}: {len(compiled.rules)} rules over {len(compiled.variables)} inputs.")
+        X = load_session(args.data)
+        base, _ = engine.score(X)
+        new, _ = compiled.score(X[:, [INPUT_VARIABLES.index(name) for name in compiled.input_names]])
+        same = np.isclose(base, new, equal_nan=True)
+        print(f"- {int(same.sum())} of {len(X)} rows of {args.data} score the same as the current model")
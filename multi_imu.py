@@ -0,0 +1,364 @@
+import argparse
+import csv
+import heapq
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from imu import MPU6050, RateScheduler
+from imu_binlog import CSV_HEADER, BinaryLogWriter
+
+# Health states: starting until the first initialization; ok; degraded after
+# a failed read; failed after `max_consecutive_errors` failures in a row (or
+# no answer at start), when the sensor is dropped and re-initialized every
+# `retry_s` until it answers again.
+STARTING, OK, DEGRADED, FAILED = "starting", "ok", "degraded", "failed"
+
+
+class SensorSpec:
+    # One MPU6050 to poll: bus 1 carries 0x68 (AD0 low) and 0x69 (AD0 high),
+    # e.g. frame and helmet. `bus` injects an SMBus-compatible object.
+    def __init__(self, name, bus_id=1, address=0x68, rate_hz=50.0, bus=None):
+        self.name = name
+        self.bus_id = bus_id
+        self.address = address
+        self.rate_hz = rate_hz
+        self.bus = bus
+
+    @classmethod
+    def parse(cls, text, rate_hz=50.0):
+        # "name:bus:address[:rate]", e.g. "helmet:1:0x69:100"
+        parts = text.split(":")
+        if len(parts) not in (3, 4):
+            raise ValueError(f"Bad sensor spec '{text}', expected name:bus:address[:rate]")
+        rate = float(parts[3]) if len(parts) == 4 else rate_hz
+        return cls(parts[0], int(parts[1]), int(parts[2], 0), rate)
+
+
+class LockedBus:
+    # Serializes transactions of the sensors sharing one physical bus, so a
+    # block read on 0x68 is never interleaved with one on 0x69
+    def __init__(self, bus):
+        self.bus = bus
+        self.lock = threading.Lock()
+
+    def write_byte_data(self, address, register, value):
+        with self.lock:
+            return self.bus.write_byte_data(address, register, value)
+
+    def read_byte_data(self, address, register):
+        with self.lock:
+            return self.bus.read_byte_data(address, register)
+
+    def read_i2c_block_data(self, address, register, length):
+        with self.lock:
+            return self.bus.read_i2c_block_data(address, register, length)
+
+    def close(self):
+        # Closed once by the manager, not by each sensor
+        pass
+
+
+class SensorHealth:
+    def __init__(self, name):
+        self.name = name
+        self.state = STARTING
+        self.samples = 0
+        self.read_errors = 0
+        self.consecutive_errors = 0
+        self.init_attempts = 0
+        self.recoveries = 0
+        self.dropped = 0
+        self.last_sample_ns = None
+        self.last_error = None
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class MultiSensorAcquisition:
+    # Polls several MPU6050s concurrently, one worker thread per sensor with
+    # its own RateScheduler, so a slow or failing sensor only delays itself.
+    # Every sample is stamped in the reading thread with nanoseconds since
+    # one shared time.monotonic_ns() origin; wall-clock times are derived
+    # from that origin, so all sensors share one consistent clock.
+    #
+    # Workers push (t_ns, name, data) onto one bounded queue (samples are
+    # dropped and counted when it is full). samples() merges them back into
+    # time order: a sample is released once it is `reorder_s` old, which
+    # bounds how late a sample can arrive, and does not wait on sensors that
+    # have stopped producing.
+
+    def __init__(self, specs, max_consecutive_errors=5, retry_s=1.0, reorder_s=0.05, queue_size=65536,
+                 verbose=False):
+        names = [s.name for s in specs]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Sensor names must be unique, got {names}")
+        self.specs = specs
+        self.max_consecutive_errors = max_consecutive_errors
+        self.retry_s = retry_s
+        self.reorder_s = reorder_s
+        self.verbose = verbose
+        self.health = {s.name: SensorHealth(s.name) for s in specs}
+        self.schedulers = {}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._threads = []
+        self._buses = {}
+        self._opened = []
+        self._heap = []
+        self._seq = 0
+        self.max_samples = None
+        self.t0_ns = None
+        self.wall_t0_ns = None
+
+    def _bus(self, spec):
+        # Injected buses are wrapped per object, real ones opened once per
+        # bus id; either way sensors on the same bus share one lock
+        key = id(spec.bus) if spec.bus is not None else spec.bus_id
+        if key not in self._buses:
+            if spec.bus is None:
+                from smbus2 import SMBus
+                raw = SMBus(spec.bus_id)
+            else:
+                raw = spec.bus
+            self._opened.append(raw)
+            self._buses[key] = LockedBus(raw)
+        return self._buses[key]
+
+    def _connect(self, spec, health):
+        health.init_attempts += 1
+        try:
+            bus = self._bus(spec)
+        except Exception as e:
+            health.state = FAILED
+            health.last_error = f"Failed to open bus {spec.bus_id}: {e}"
+            return None
+        sensor = MPU6050(address=spec.address, verbose=self.verbose, bus=bus)
+        if sensor.bus is None:
+            health.state = FAILED
+            health.last_error = f"No response at 0x{spec.address:X} on bus {spec.bus_id}"
+            return None
+        if health.samples or health.read_errors:
+            health.recoveries += 1
+        health.state = OK
+        health.consecutive_errors = 0
+        return sensor
+
+    def _run_sensor(self, spec, max_samples):
+        health = self.health[spec.name]
+        scheduler = self.schedulers[spec.name]
+        sensor = self._connect(spec, health)
+        last_attempt = time.monotonic()
+        while not self._stop.is_set() and (max_samples is None or health.samples < max_samples):
+            scheduler.wait()
+            if sensor is None:
+                if time.monotonic() - last_attempt >= self.retry_s:
+                    last_attempt = time.monotonic()
+                    sensor = self._connect(spec, health)
+                continue
+            data = sensor.get_motion_data()
+            t_ns = time.monotonic_ns() - self.t0_ns
+            if data["status"] != 200:
+                health.read_errors += 1
+                health.consecutive_errors += 1
+                health.last_error = data.get("message", "")
+                health.state = DEGRADED
+                if health.consecutive_errors >= self.max_consecutive_errors:
+                    health.state = FAILED
+                    sensor = None
+                    last_attempt = time.monotonic()
+                continue
+            health.consecutive_errors = 0
+            health.state = OK
+            try:
+                self._queue.put_nowait((t_ns, spec.name, data))
+            except queue.Full:
+                health.dropped += 1
+                continue
+            health.samples += 1
+            health.last_sample_ns = t_ns
+
+    def start(self, max_samples=None):
+        # max_samples: per sensor; None runs until stop()
+        if self._threads:
+            raise RuntimeError("Acquisition already started")
+        self.max_samples = max_samples
+        self.t0_ns = time.monotonic_ns()
+        self.wall_t0_ns = time.time_ns()
+        self._stop.clear()
+        for spec in self.specs:
+            self.schedulers[spec.name] = RateScheduler(spec.rate_hz)
+            thread = threading.Thread(target=self._run_sensor, args=(spec, max_samples),
+                                      name=f"imu-{spec.name}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        for bus in self._opened:
+            bus.close()
+        self._opened = []
+        self._buses = {}
+
+    def running(self):
+        # With a sample limit, sensors that are down do not keep the run
+        # going once the others have finished
+        if self.max_samples is not None and all(
+                h.samples >= self.max_samples or h.state == FAILED for h in self.health.values()):
+            return False
+        return any(t.is_alive() for t in self._threads)
+
+    def wall_ns(self, t_ns):
+        return self.wall_t0_ns + t_ns
+
+    def _push(self, item):
+        # seq breaks timestamp ties without comparing the data dicts
+        heapq.heappush(self._heap, (item[0], self._seq, item[1], item[2]))
+        self._seq += 1
+
+    def samples(self, poll_s=0.01, deadline=None):
+        # Time-ordered (t_ns, name, data) until every worker has finished
+        # (or stop() was called) and the buffer is drained. `deadline` is a
+        # time.monotonic() value; the workers are stopped once it passes,
+        # even if no sensor is producing data.
+        reorder_ns = int(self.reorder_s * 1e9)
+        while True:
+            if deadline is not None and not self._stop.is_set() and time.monotonic() >= deadline:
+                self.stop()
+            alive = self.running()
+            try:
+                self._push(self._queue.get(timeout=poll_s))
+                while True:
+                    self._push(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            horizon = time.monotonic_ns() - self.t0_ns - reorder_ns if alive else None
+            while self._heap and (horizon is None or self._heap[0][0] <= horizon):
+                t_ns, _, name, data = heapq.heappop(self._heap)
+                yield t_ns, name, data
+            if not alive and self._queue.empty() and not self._heap:
+                return
+
+    def report(self):
+        report = {}
+        for name, health in self.health.items():
+            report[name] = {**health.as_dict(), **(self.schedulers[name].stats() if name in self.schedulers else {})}
+        return report
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def _csv_row(timestamp, data):
+    a, g = data["accel"], data["gyro"]
+    return [timestamp, a['x'], a['y'], a['z'], g['x'], g['y'], g['z']]
+
+
+def record(specs, out_dir="./imu/", duration_s=None, max_samples=None, split=False, log_format="csv",
+           on_sample=None, **options):
+    # Logs every sensor into one time-ordered CSV with a `sensor` column
+    # (imu.py's columns otherwise), or with split=True one log per sensor:
+    # <stem>_<name>_imu.csv / .bin, the same formats imu.py writes.
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    if log_format == "bin" and not split:
+        raise ValueError("Binary logs hold a single sensor; use split=True")
+    acquisition = MultiSensorAcquisition(specs, **options)
+    files, writers, paths = {}, {}, []
+    try:
+        if split:
+            for spec in specs:
+                path = f"{stem}_{spec.name}_imu.{log_format}"
+                paths.append(path)
+                if log_format == "bin":
+                    writers[spec.name] = BinaryLogWriter(path)
+                else:
+                    files[spec.name] = open(path, 'w', newline='')
+                    writers[spec.name] = csv.writer(files[spec.name])
+                    writers[spec.name].writerow(CSV_HEADER)
+        else:
+            path = stem + "_multi_imu.csv"
+            paths.append(path)
+            files[None] = open(path, 'w', newline='')
+            merged = csv.writer(files[None])
+            merged.writerow(["sensor"] + CSV_HEADER)
+
+        acquisition.start(max_samples)
+        deadline = None if duration_s is None else time.monotonic() + duration_s
+        written = 0
+        try:
+            for t_ns, name, data in acquisition.samples(deadline=deadline):
+                wall_ns = acquisition.wall_ns(t_ns)
+                if log_format == "bin":
+                    a, g = data["accel"], data["gyro"]
+                    writers[name].append(wall_ns, a['x'], a['y'], a['z'], g['x'], g['y'], g['z'])
+                else:
+                    timestamp = datetime.fromtimestamp(wall_ns / 1e9).isoformat()
+                    if split:
+                        writers[name].writerow(_csv_row(timestamp, data))
+                    else:
+                        merged.writerow([name] + _csv_row(timestamp, data))
+                written += 1
+                if on_sample is not None:
+                    on_sample(t_ns, name, data)
+        except KeyboardInterrupt:
+            print("\nUser interrupted. Stopping acquisition.")
+    finally:
+        acquisition.stop()
+        for writer in writers.values():
+            if isinstance(writer, BinaryLogWriter):
+                writer.close()
+        for f in files.values():
+            f.close()
+    return {"status": 200, "message": f"Recorded {written} samples.", "files": paths,
+            "sensors": acquisition.report()}
+
+
+def simulated_specs(specs, imu_file="20250601_142500_imu.csv", fail=()):
+    # Replaces the hardware with recorded register streams: one FakeI2CBus
+    # per bus id, one replayed MPU6050 per address. Sensors named in `fail`
+    # get no device on the bus, so they never answer.
+    from fake_smbus import FakeI2CBus
+    from replay_harness import raw_from_imu_csv, recorded_bus
+    samples, _ = raw_from_imu_csv(imu_file)
+    buses = {}
+    for i, spec in enumerate(specs):
+        devices = buses.setdefault(spec.bus_id, [])
+        if spec.name not in fail:
+            devices.append(recorded_bus(samples, offset=i * len(samples) // len(specs), address=spec.address))
+    shared = {bus_id: FakeI2CBus(devices) for bus_id, devices in buses.items()}
+    return [SensorSpec(s.name, s.bus_id, s.address, s.rate_hz, bus=shared[s.bus_id]) for s in specs]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Log several MPU6050s concurrently on a shared clock")
+    parser.add_argument("--sensor", action="append", dest="sensors", metavar="NAME:BUS:ADDRESS[:RATE]",
+                        help="repeat per sensor (default: frame:1:0x68 and helmet:1:0x69)")
+    parser.add_argument("--rate", type=float, default=50.0, help="default sampling rate in Hz")
+    parser.add_argument("--duration", type=float, help="seconds to record (default: until Ctrl+C)")
+    parser.add_argument("--samples", type=int, help="stop after this many samples per sensor")
+    parser.add_argument("--split", action="store_true", help="one log per sensor instead of a merged one")
+    parser.add_argument("--format", default="csv", choices=["csv", "bin"], help="per-sensor log format (--split)")
+    parser.add_argument("--out-dir", default="./imu/")
+    parser.add_argument("--simulate", action="store_true", help="replay a recorded IMU log instead of hardware")
+    parser.add_argument("--imu", default="20250601_142500_imu.csv", help="recording used by --simulate")
+    parser.add_argument("--fail", nargs="*", default=[], help="with --simulate: sensors that never answer")
+    args = parser.parse_args()
+
+    specs = [SensorSpec.parse(s, args.rate) for s in args.sensors or ["frame:1:0x68", "helmet:1:0x69"]]
+    if args.simulate:
+        specs = simulated_specs(specs, args.imu, args.fail)
+    result = record(specs, args.out_dir, args.duration, args.samples, args.split, args.format)
+    print(result["message"])
+    for path in result["files"]:
+        print(f"Log saved to: {path}")
+    for name, health in result["sensors"].items():
+        print(f"- {name}: {health['state']}, {health['samples']} samples, {health['read_errors']} read errors, "
+              f"{health['missed_deadlines']} missed deadlines, {health['dropped']} dropped")
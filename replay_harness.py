@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from fake_smbus import FakeSMBus
+from live_scoring import LiveScoringDaemon, ReplayObdSource, build_scorer, percentile
+
+# imu.py's full-scale factors (+-2 g, +-250 deg/s) and temperature formula
+ACCEL_SCALE = 16384.0
+GYRO_SCALE = 131.0
+TEMP_RAW_25C = int(round((25.0 - 36.53) * 340.0))
+
+
+def _int16(value):
+    return max(-32768, min(32767, int(round(value))))
+
+
+def raw_from_imu_csv(path):
+    # Inverts imu.py's scaling: (ax, ay, az, temp, gx, gy, gz) int16 counts per
+    # row. The logged values are count / scale, so this is exact for files
+    # imu.py wrote; temperature was not logged and reads as 25 C. Also returns
+    # the recorded sample interval (median of the timestamp gaps).
+    samples, stamps = [], []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            samples.append((_int16(float(row['accel_x']) * ACCEL_SCALE), _int16(float(row['accel_y']) * ACCEL_SCALE),
+                            _int16(float(row['accel_z']) * ACCEL_SCALE), TEMP_RAW_25C,
+                            _int16(float(row['gyro_x']) * GYRO_SCALE), _int16(float(row['gyro_y']) * GYRO_SCALE),
+                            _int16(float(row['gyro_z']) * GYRO_SCALE)))
+            stamps.append(row['timestamp'])
+    interval = 0.5
+    if len(stamps) > 1:
+        t = np.array(stamps, dtype='datetime64[ns]').astype(np.int64) / 1e9
+        interval = float(np.median(np.diff(t)))
+    return samples, interval
+
+
+def recorded_bus(samples, offset=0, loop=True, address=0x68):
+    # FakeSMBus serving the recorded register blocks; `offset` rotates the
+    # recording so simulated bikes are not in lockstep
+    offset %= len(samples)
+    return FakeSMBus.from_raw(samples[offset:] + samples[:offset], address=address, loop=loop)
+
+
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _bike_id(worker, i):
+    return f"bike{worker:02d}_{i:04d}"
+
+
+async def _run_bikes(bikes, imu_file, obd_files, speed, samples_per_bike, budget_ms, log_dir, worker):
+    from imu import MPU6050
+    scorer = build_scorer()
+    samples, interval = raw_from_imu_csv(imu_file)
+    rate_hz = speed / interval if speed else 0.0
+    rng = np.random.default_rng(worker)
+    daemons = []
+    for i in range(bikes):
+        sensor = MPU6050(verbose=False, bus=recorded_bus(samples, int(rng.integers(len(samples)))))
+        obd = ReplayObdSource(obd_files[i % len(obd_files)])
+        out = os.path.join(log_dir, _bike_id(worker, i) + "_scores.csv") if log_dir else None
+        # Samples are on the recording's clock (index x interval) at any speed
+        daemons.append(LiveScoringDaemon(scorer, sensor, obd, rate_hz=rate_hz, out_file=out,
+                                         latency_budget_ms=budget_ms, sample_interval_s=interval))
+    start = time.perf_counter()
+    stats = await asyncio.gather(*(d.run(max_samples=samples_per_bike) for d in daemons))
+    wall = time.perf_counter() - start
+    latencies = [lat for d in daemons for lat in d.latencies_ms]
+    return {'bikes': bikes, 'wall_s': wall, 'stats': stats, 'latencies_ms': latencies, 'peak_rss_mb': _rss_mb()}
+
+
+def run_worker(worker, bikes, imu_file, obd_files, speed, samples_per_bike, budget_ms, log_dir):
+    return asyncio.run(_run_bikes(bikes, imu_file, obd_files, speed, samples_per_bike, budget_ms, log_dir, worker))
+
+
+def load_test(bikes=10, imu_file="20250601_142500_imu.csv", obd_files=("safe_riding.csv", "aggressive_riding.csv"),
+              speed=0.0, samples_per_bike=1000, processes=1, budget_ms=20.0, log_dir=None):
+    # Runs `bikes` simulated bikes (IMU from the recorded register stream,
+    # OBD from the exports) split over `processes` worker processes, each an
+    # asyncio loop of LiveScoringDaemons. speed: 1 = real time, N = N x, 0 =
+    # unthrottled. Returns sustained throughput, latency and memory figures.
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    shares = [bikes // processes + (1 if w < bikes % processes else 0) for w in range(processes)]
+    args = [(w, n, imu_file, list(obd_files), speed, samples_per_bike, budget_ms, log_dir)
+            for w, n in enumerate(shares) if n]
+    start = time.perf_counter()
+    if processes == 1:
+        results = [run_worker(*args[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(run_worker, *zip(*args)))
+    wall = time.perf_counter() - start
+
+    totals = {}
+    for r in results:
+        for s in r['stats']:
+            for key in ('samples', 'scored', 'no_result', 'read_errors', 'dropped_samples', 'dropped_log_rows',
+                        'over_budget'):
+                totals[key] = totals.get(key, 0) + s[key]
+    latencies = [lat for r in results for lat in r['latencies_ms']]
+    return {
+        'bikes': bikes,
+        'processes': processes,
+        'speed': speed,
+        'samples_per_bike': samples_per_bike,
+        'wall_s': wall,
+        'throughput_samples_per_s': totals.get('scored', 0) / wall if wall else None,
+        **totals,
+        'latency_p50_ms': percentile(latencies, 50),
+        'latency_p95_ms': percentile(latencies, 95),
+        'latency_p99_ms': percentile(latencies, 99),
+        'latency_max_ms': max(latencies) if latencies else None,
+        'peak_rss_mb_per_process': max(r['peak_rss_mb'] for r in results),
+        'peak_rss_mb_total': sum(r['peak_rss_mb'] for r in results)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test ingestion and scoring with replayed IMU/OBD logs")
+    parser.add_argument("--bikes", type=int, default=10)
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = real time, N = N x, 0 = unthrottled")
+    parser.add_argument("--samples", type=int, default=1000, help="samples per bike")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--imu", default="20250601_142500_imu.csv")
+    parser.add_argument("--obd", nargs="+", default=["safe_riding.csv", "aggressive_riding.csv"])
+    parser.add_argument("--budget-ms", type=float, default=20.0)
+    parser.add_argument("--log-dir", help="write every bike's scores here (adds the logging I/O)")
+    parser.add_argument("--out", help="save the report as JSON")
+    args = parser.parse_args()
+
+    report = load_test(args.bikes, args.imu, args.obd, args.speed, args.samples, args.processes, args.budget_ms,
+                       args.log_dir)
+    print("Replay load test complete.")
+    for key, value in report.items():
+        print(f"- {key}: {value}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to: {args.out}")
@@ -0,0 +1,239 @@
+import argparse
+import csv
+import math
+from collections import deque
+import numpy as np
+from columnar_io import iter_table
+
+UNSAFE_LABELS = ("Unsafe", "Highly Unsafe")
+
+
+def _is_unsafe(score, label):
+    if label is not None:
+        return label in UNSAFE_LABELS
+    return score is not None and score > 5
+
+
+class RollingWindow:
+    # Statistics over the scores of the last `window_s` seconds, updated in
+    # amortized O(1) per score: a deque of samples with running sums for the
+    # mean and the unsafe share, and a monotonic (decreasing) deque for the
+    # max. Each sample is weighted by the time since the previous one, so
+    # the unsafe share is a share of time even when the rate varies.
+    # "No Result" rows (score None) take up time but not mean / max.
+
+    def __init__(self, window_s):
+        self.window_s = window_s
+        self._samples = deque()   # (t, score or None, weight, unsafe)
+        self._max = deque()       # (t, score), scores decreasing
+        self.count = 0
+        self.score_sum = 0.0
+        self.weight = 0.0
+        self.unsafe_weight = 0.0
+        self.last_t = None
+
+    def update(self, t, score, unsafe):
+        weight = 0.0 if self.last_t is None else max(t - self.last_t, 0.0)
+        self.last_t = t
+        self._samples.append((t, score, weight, unsafe))
+        self.weight += weight
+        if unsafe:
+            self.unsafe_weight += weight
+        if score is not None:
+            self.count += 1
+            self.score_sum += score
+            while self._max and self._max[-1][1] <= score:
+                self._max.pop()
+            self._max.append((t, score))
+        self._expire(t)
+
+    def _expire(self, now):
+        horizon = now - self.window_s
+        samples = self._samples
+        while samples and samples[0][0] < horizon:
+            _, score, weight, unsafe = samples.popleft()
+            self.weight -= weight
+            if unsafe:
+                self.unsafe_weight -= weight
+            if score is not None:
+                self.count -= 1
+                self.score_sum -= score
+        while self._max and self._max[0][0] < horizon:
+            self._max.popleft()
+        if not samples:
+            self.weight = self.unsafe_weight = self.score_sum = 0.0
+
+    @property
+    def mean(self):
+        return self.score_sum / self.count if self.count else None
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+    @property
+    def unsafe_share(self):
+        # Fraction of the window's time spent in Unsafe / Highly Unsafe
+        if self.weight > 0:
+            return min(max(self.unsafe_weight / self.weight, 0.0), 1.0)
+        return (1.0 if self._samples[-1][3] else 0.0) if self._samples else None
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class HysteresisAlert:
+    # Raises when `metric` of window `window` crosses `on` and clears only once
+    # it is back past `off`, so a value hovering at the threshold does not
+    # flap. direction='above' alerts on high values, 'below' on low ones.
+    # `hold_s` requires the raise condition to persist that long first.
+
+    def __init__(self, name, window, metric, on, off, direction='above', hold_s=0.0):
+        if (direction == 'above' and off > on) or (direction == 'below' and off < on):
+            raise ValueError(f"Alert '{name}': the clear threshold must be on the safe side of the raise one")
+        self.name = name
+        self.window = window
+        self.metric = metric
+        self.on = on
+        self.off = off
+        self.direction = direction
+        self.hold_s = hold_s
+        self.active = False
+        self._pending_since = None
+
+    def _past(self, value, threshold):
+        return value >= threshold if self.direction == 'above' else value <= threshold
+
+    def check(self, t, value):
+        # Returns "raise", "clear" or None
+        if value is None:
+            return None
+        if not self.active:
+            if self._past(value, self.on):
+                if self._pending_since is None:
+                    self._pending_since = t
+                if t - self._pending_since >= self.hold_s:
+                    self.active = True
+                    self._pending_since = None
+                    return "raise"
+            else:
+                self._pending_since = None
+        elif value <= self.off if self.direction == 'above' else value >= self.off:
+            self.active = False
+            return "clear"
+        return None
+
+
+DEFAULT_WINDOWS = {'10s': 10.0, '60s': 60.0, '5min': 300.0}
+DEFAULT_ALERTS = [
+    ('unsafe_share_60s', '60s', 'unsafe_share', 0.30, 0.15),
+    ('mean_score_60s', '60s', 'mean', 6.0, 5.0),
+    ('max_score_10s', '10s', 'max', 9.0, 7.0),
+]
+
+
+class SessionMonitor:
+    # Rolling windows plus alerts over one score stream. Feed it with
+    # update(t, score, label) from an offline replay (t from the results) or
+    # a live stream (t from a monotonic clock); alert events go to `on_alert`
+    # and to self.events.
+
+    def __init__(self, windows=None, alerts=None, on_alert=None, keep_events=10000):
+        self.windows = {name: RollingWindow(s) for name, s in (windows or DEFAULT_WINDOWS).items()}
+        self.alerts = [a if isinstance(a, HysteresisAlert) else HysteresisAlert(*a)
+                       for a in (DEFAULT_ALERTS if alerts is None else alerts)]
+        for alert in self.alerts:
+            if alert.window not in self.windows:
+                raise ValueError(f"Alert '{alert.name}' uses unknown window '{alert.window}'")
+        self.on_alert = on_alert
+        self.events = deque(maxlen=keep_events)
+        self.last_unsafe_t = None
+        self.t = None
+
+    def update(self, t, score, label=None):
+        unsafe = _is_unsafe(score, label)
+        self.t = t
+        if unsafe:
+            self.last_unsafe_t = t
+        for window in self.windows.values():
+            window.update(t, score, unsafe)
+        fired = []
+        for alert in self.alerts:
+            window = self.windows[alert.window]
+            value = getattr(window, alert.metric)
+            state = alert.check(t, value)
+            if state:
+                event = {'t': t, 'alert': alert.name, 'state': state, 'value': value}
+                self.events.append(event)
+                fired.append(event)
+                if self.on_alert is not None:
+                    self.on_alert(event)
+        return fired
+
+    @property
+    def time_since_unsafe(self):
+        return None if self.last_unsafe_t is None else self.t - self.last_unsafe_t
+
+    def snapshot(self):
+        snap = {'t': self.t, 'time_since_unsafe_s': self.time_since_unsafe}
+        for name, window in self.windows.items():
+            snap[f'mean_{name}'] = window.mean
+            snap[f'max_{name}'] = window.max
+            snap[f'unsafe_share_{name}'] = window.unsafe_share
+        snap['active_alerts'] = ";".join(a.name for a in self.alerts if a.active)
+        return snap
+
+
+def _score(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return float(value)
+
+
+def replay_results(results_file, time_column='elapsed_s', row_interval_s=1.0, monitor=None, timeline_file=None,
+                   chunk_size=10000):
+    # Offline replay of a results file (CSV / Parquet / Feather). Rows carry
+    # no time when scored with index alignment, so row i is then taken to be
+    # at i * row_interval_s. Optionally writes the per-row rolling timeline.
+    monitor = monitor or SessionMonitor()
+    writer = out = None
+    row = 0
+    try:
+        for chunk in iter_table(results_file, chunk_size=chunk_size):
+            if time_column in chunk:
+                times = chunk[time_column].to_numpy(dtype=float)
+            else:
+                times = (row + np.arange(len(chunk))) * row_interval_s
+            scores = chunk['Safety Score'].astype(object).where(chunk['Safety Score'].notna(), None).tolist()
+            labels = chunk['Safety Label'].astype(object).tolist()
+            for t, score, label in zip(times.tolist(), scores, labels):
+                monitor.update(t, _score(score), label)
+                if timeline_file:
+                    snap = monitor.snapshot()
+                    if writer is None:
+                        out = open(timeline_file, 'w', newline='')
+                        writer = csv.DictWriter(out, fieldnames=list(snap))
+                        writer.writeheader()
+                    writer.writerow(snap)
+            row += len(chunk)
+    finally:
+        if out is not None:
+            out.close()
+    return monitor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling-window analytics and alerts over a scored session")
+    parser.add_argument("results", nargs="?", default="Result/fuzzy_results_real_lean_safe.csv")
+    parser.add_argument("--time-column", default="elapsed_s", help="used when present (aligned results)")
+    parser.add_argument("--row-interval", type=float, default=1.0, help="seconds per row otherwise")
+    parser.add_argument("--timeline", default="Result/rolling_timeline.csv")
+    args = parser.parse_args()
+
+    monitor = replay_results(args.results, args.time_column, args.row_interval, timeline_file=args.timeline)
+    print("Rolling analytics complete.")
+    for event in monitor.events:
+        print(f"- t={event['t']:.1f}s {event['alert']} {event['state']} ({event['value']:.2f})")
+    if not monitor.events:
+        print("- No alerts.")
+    print(f"Timeline saved to: {args.timeline}")
@@ -0,0 +1,146 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from batch_inference import INPUT_COLUMNS, MODES
+from compiled_model import engine_hash
+
+# Quantization step per input; rows that agree at this resolution share a
+# cached score. Coarser steps give more hits and a larger approximation.
+DEFAULT_RESOLUTION = {
+    'speed': 0.1,             # km/h
+    'rpm': 5.0,               # rpm
+    'acceleration': 0.1,      # %
+    'throttle': 0.1,          # %
+    'power': 0.01,            # hp
+    'intake_pressure': 0.05,  # psi
+    'lean': 0.1               # degrees
+}
+
+_MISSING = np.iinfo(np.int64).min
+
+# Bump whenever the cache file layout changes; old files are ignored
+CACHE_FORMAT_VERSION = 2
+
+
+class QuantizedScoreCache:
+    # Drop-in wrapper around FuzzyBatchEngine.score(). Every row is snapped
+    # to its quantization cell and the score of the cell centre is memoized
+    # with bounded LRU eviction. Keys carry the inference mode, so grid and
+    # analytic scores never alias. With `path` the cache is loaded from /
+    # saved to an .npz file, which is ignored when it was written for another
+    # model (compiled_model.engine_hash), resolution or `tag` (e.g.
+    # compiled_model.source_hash()).
+
+    def __init__(self, scorer, resolution=None, max_entries=100000, path=None, tag=""):
+        self.scorer = scorer
+        resolution = {**DEFAULT_RESOLUTION, **(resolution or {})}
+        self.resolution = np.array([resolution[name] for name in scorer.input_names], dtype=float)
+        self.max_entries = max_entries
+        self.path = path
+        self.tag = tag
+        self.model = engine_hash(scorer)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    @property
+    def input_names(self):
+        return self.scorer.input_names
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def _keys(self, X, mode):
+        # (mode index, cell index per input)
+        q = np.round(X / self.resolution)
+        q = np.where(np.isnan(q), _MISSING, q).astype(np.int64)
+        m = MODES.index(mode)
+        return [(m, *row) for row in q.tolist()]
+
+    def _centres(self, keys):
+        q = np.array(keys, dtype=np.int64)[:, 1:]
+        return np.where(q == _MISSING, np.nan, q * self.resolution)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def score(self, X, **kwargs):
+        X = np.asarray(X, dtype=float)
+        scores = np.full(len(X), np.nan)
+        valid = np.zeros(len(X), dtype=bool)
+        mode = kwargs.get('mode') or self.scorer.mode
+
+        pending = {}
+        for i, key in enumerate(self._keys(X, mode)):
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                scores[i], valid[i] = cached
+                self.hits += 1
+            elif key in pending:
+                pending[key].append(i)
+                self.hits += 1
+            else:
+                pending[key] = [i]
+                self.misses += 1
+
+        if pending:
+            keys = list(pending)
+            s, ok = self.scorer.score(self._centres(keys), **kwargs)
+            for key, si, oki in zip(keys, s.tolist(), ok.tolist()):
+                rows = pending[key]
+                scores[rows] = si
+                valid[rows] = oki
+                self._store(key, (si, oki))
+        return scores, valid
+
+    def score_frame(self, df, **kwargs):
+        X = df[[INPUT_COLUMNS[name] for name in self.input_names]].to_numpy(dtype=float)
+        return self.score(X, **kwargs)
+
+    def save(self, path=None):
+        path = path or self.path
+        keys = np.array(list(self._entries), dtype=np.int64).reshape(-1, len(self.resolution) + 1)
+        values = list(self._entries.values())
+        tmp = path + ".tmp.npz"
+        np.savez(tmp,
+                 keys=keys,
+                 scores=np.array([v[0] for v in values], dtype=float),
+                 valid=np.array([v[1] for v in values], dtype=bool),
+                 resolution=self.resolution,
+                 version=np.array(CACHE_FORMAT_VERSION),
+                 model=np.array(self.model),
+                 tag=np.array(self.tag))
+        os.replace(tmp, path)
+
+    def load(self, path=None):
+        # Entries persisted by another format version, model, resolution or
+        # tag are ignored
+        path = path or self.path
+        with np.load(path, allow_pickle=False) as data:
+            if 'version' not in data.files or int(data['version']) != CACHE_FORMAT_VERSION:
+                return False
+            if str(data['model']) != self.model or str(data['tag']) != self.tag:
+                return False
+            if not np.array_equal(data['resolution'], self.resolution):
+                return False
+            keys = [tuple(row) for row in data['keys'].tolist()]
+            for key, s, ok in zip(keys, data['scores'].tolist(), data['valid'].tolist()):
+                self._store(key, (s, ok))
+        return True
@@ -0,0 +1,163 @@
+import time
+import numpy as np
+import pandas as pd
+from batch_inference import INPUT_COLUMNS, INPUT_VARIABLES, safety_label
+from columnar_io import TableWriter, iter_table, read_table, write_table
+from instrumentation import count, observe_total, stage, timed_iter
+from lean_estimator import DEFAULT_GYRO_AXIS, lean_from_imu
+from time_alignment import align_session
+
+OUTPUT_COLUMNS = [INPUT_COLUMNS[name] for name in INPUT_VARIABLES]
+OBD_COLUMNS = [c for c in OUTPUT_COLUMNS if c != 'lean']
+IMU_COLUMNS = ["accel_x", "accel_z"]
+LEAN_METHODS = ('accel', 'fusion')
+UNSAFE_LABELS = ("Unsafe", "Highly Unsafe")
+
+
+def rating(score):
+    if score <= 3:
+        return "Safe"
+    elif score <= 5:
+        return "Moderately Safe"
+    elif score <= 7:
+        return "Unsafe"
+    return "Highly Unsafe"
+
+
+class SessionSummary:
+    # Running session statistics; O(1) memory regardless of session length
+    def __init__(self):
+        self.rows = 0
+        self.scored = 0
+        self.score_sum = 0
+        self.unsafe = 0
+
+    def update(self, scores, labels):
+        for score, label in zip(scores, labels):
+            self.rows += 1
+            if score is not None:
+                self.scored += 1
+                self.score_sum += score
+            if label in UNSAFE_LABELS:
+                self.unsafe += 1
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.scored += other.scored
+        self.score_sum += other.score_sum
+        self.unsafe += other.unsafe
+        return self
+
+    @property
+    def mean_score(self):
+        return round(self.score_sum / self.scored, 2) if self.scored else float('nan')
+
+    @property
+    def percent_unsafe(self):
+        return 100 * self.unsafe / self.rows if self.rows else 0.0
+
+    @property
+    def rating(self):
+        # A session with no scored rows has no mean to rate
+        return rating(self.mean_score) if self.scored else "No Result"
+
+
+def imu_lean(sensor_df):
+    return np.degrees(np.arctan2(sensor_df["accel_x"], sensor_df["accel_z"])).abs()
+
+
+def imu_columns(lean_method='accel'):
+    # 'fusion' also needs the clock and the gyro axis (see lean_estimator.py)
+    if lean_method == 'fusion':
+        return ['timestamp'] + IMU_COLUMNS + ['gyro_' + DEFAULT_GYRO_AXIS]
+    return IMU_COLUMNS
+
+
+def paired_chunks(obd_chunks, imu_chunks):
+    # Re-cut two chunk streams into equally sized, index-aligned pairs; stops
+    # when either source runs out (the old min_len truncation).
+    obd_buf, imu_buf = None, None
+    obd_chunks, imu_chunks = iter(obd_chunks), iter(imu_chunks)
+    while True:
+        if obd_buf is None or len(obd_buf) == 0:
+            obd_buf = next(obd_chunks, None)
+        if imu_buf is None or len(imu_buf) == 0:
+            imu_buf = next(imu_chunks, None)
+        if obd_buf is None or imu_buf is None:
+            return
+        n = min(len(obd_buf), len(imu_buf))
+        yield obd_buf.iloc[:n].reset_index(drop=True), imu_buf.iloc[:n].reset_index(drop=True)
+        obd_buf, imu_buf = obd_buf.iloc[n:], imu_buf.iloc[n:]
+
+
+def score_frame(engine, df):
+    start = time.perf_counter()
+    raw_scores, valid = engine.score_frame(df)
+    if len(df):
+        # Chunk time spread over its rows: a mean, not per-row percentiles
+        observe_total("row_latency_amortized_us", 1e6 * (time.perf_counter() - start), len(df))
+    # Counted here rather than in the engine so rows answered by a score
+    # cache are included
+    missing = df[[INPUT_COLUMNS[name] for name in engine.input_names]].isna().all(axis=1).to_numpy()
+    count("rows_scored", len(df))
+    count("no_result_rows", int((~valid & ~missing).sum()), reason="no_rule_fired")
+    count("no_result_rows", int(missing.sum()), reason="all_inputs_missing")
+    scores = [int(s) if ok else None for s, ok in zip(np.round(raw_scores), valid)]
+    labels = [safety_label(s) for s in scores]
+    df['Safety Score'] = pd.array(scores, dtype="Int64")
+    df['Safety Label'] = labels
+    return df, scores, labels
+
+
+def score_chunk(engine, obd_chunk, imu_chunk, lean=None):
+    df = obd_chunk.copy()
+    if lean is None:
+        with stage("lean"):
+            lean = imu_lean(imu_chunk).to_numpy()
+    df["lean"] = lean
+    return score_frame(engine, df[OUTPUT_COLUMNS])
+
+
+def stream_session(engine, obd_file, imu_file, out_file, chunk_size=10000, lean_method='accel'):
+    # Reads both logs chunk by chunk, scores each aligned chunk and appends it
+    # to out_file. Peak memory depends on chunk_size, not session length.
+    # The fusion filter state is carried from one chunk to the next.
+    # Inputs and output may be CSV, Parquet or Feather (by extension); only
+    # the input columns scoring needs are read.
+    summary = SessionSummary()
+    columns = imu_columns(lean_method)
+    # Fixed dtypes so every chunk serializes the same way
+    obd_chunks = iter_table(obd_file, OBD_COLUMNS, {c: 'float64' for c in OBD_COLUMNS}, chunk_size)
+    imu_chunks = iter_table(imu_file, columns, {c: 'float64' for c in columns if c != 'timestamp'}, chunk_size)
+    state = None
+    with TableWriter(out_file) as out:
+        for obd_chunk, imu_chunk in timed_iter("read", paired_chunks(obd_chunks, imu_chunks)):
+            lean = None
+            if lean_method != 'accel':
+                with stage("lean"):
+                    lean, state = lean_from_imu(imu_chunk, lean_method, state=state)
+            df, scores, labels = score_chunk(engine, obd_chunk, imu_chunk, lean)
+            with stage("write"):
+                out.write(df)
+            summary.update(scores, labels)
+    return summary
+
+
+def score_aligned_session(engine, obd_file, imu_file, out_file, rate='obd', how='max', tolerance=None,
+                          offset=0.0, clock='hms', lean_method='accel'):
+    # Timestamp-aligned variant of stream_session (see time_alignment.py).
+    # Both logs are loaded whole; results carry an extra elapsed_s column.
+    with stage("read"):
+        obd_df = read_table(obd_file, ['parsed_time'] + OBD_COLUMNS, {c: 'float64' for c in OBD_COLUMNS})
+        imu_df = read_table(imu_file, sorted(set(['timestamp'] + imu_columns(lean_method))))
+    with stage("lean"):
+        imu_df['lean'] = lean_from_imu(imu_df, lean_method)[0]
+    with stage("align"):
+        aligned = align_session(obd_df, imu_df, rate=rate, how=how, tolerance=tolerance, offset=offset,
+                                clock=clock, obd_columns=OBD_COLUMNS)
+    df, scores, labels = score_frame(engine, aligned[['elapsed_s'] + OUTPUT_COLUMNS])
+    with stage("write"):
+        write_table(df, out_file)
+    summary = SessionSummary()
+    summary.update(scores, labels)
+    return summary
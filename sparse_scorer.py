@@ -0,0 +1,295 @@
+import math
+from batch_inference import OP_TERM, OP_AND, OP_OR, OP_NOT
+
+
+def _tri(x, a, b, c):
+    if x == b:
+        return 1.0
+    if a < x < b:
+        return (x - a) / (b - a)
+    if b < x < c:
+        return (c - x) / (c - b)
+    return 0.0
+
+
+def _fmin(a, b):
+    # np.fmin on scalars: a missing (NaN) side drops out
+    if a != a:
+        return b
+    if b != b:
+        return a
+    return a if a < b else b
+
+
+def _fmax(a, b):
+    if a != a:
+        return b
+    if b != b:
+        return a
+    return a if a > b else b
+
+
+def _edges(a, b, c):
+    edges = []
+    if b > a:
+        edges.append((1.0 / (b - a), -a / (b - a)))
+    if c > b:
+        edges.append((-1.0 / (c - b), c / (c - b)))
+    return edges
+
+
+class SparseScorer:
+    # Single-sample scorer for the live path. Same semantics as
+    # FuzzyBatchEngine.score(mode='analytic'), but only rules whose antecedent
+    # terms are all active are evaluated, and shared sub-expressions (e.g.
+    # speed['high'] & lean['high']) are computed once per sample. Everything
+    # that does not depend on the sample (term numbering, per-rule leaf
+    # counts, the sorted output breakpoints of every set of active output
+    # terms) is built here, and the per-sample buffers are reused.
+    #
+    # Measured on one slow 1-core box (CPython 3.11), warm: ~13 us p50 /
+    # ~35 us p99 on uniform random inputs, ~30 us p50 on safe_riding.csv
+    # (half its rows have a missing input). benchmark.py sparse_latency,
+    # which has no warm-up, reports ~25 us p50. Pure Python, so this is tens
+    # of microseconds, not single digits.
+
+    def __init__(self, engine):
+        if engine.mf_parameters is None:
+            raise ValueError("SparseScorer needs trimf parameters (compile the model with mf_parameters)")
+        self.input_names = engine.input_names
+        self.params = [[tuple(map(float, p)) for p in engine.mf_parameters[name]] for name in self.input_names]
+        self.bounds = [(float(u[0]), float(u[-1])) for _, u, _, _ in engine.variables]
+
+        # Input terms numbered flat: term t of variable v is term_base[v] + t
+        self.term_base, self.var_terms = [], []
+        for v, params in enumerate(self.params):
+            base = sum(len(p) for p in self.params[:v])
+            self.term_base.append(base)
+            self.var_terms.append([(base + t,) + p for t, p in enumerate(params)])
+        n_terms = sum(len(p) for p in self.params)
+
+        out_name, out_universe, _, _ = engine.output
+        self.out_params = [tuple(map(float, p)) for p in engine.mf_parameters[out_name]]
+        self.out_lo, self.out_hi = float(out_universe[0]), float(out_universe[-1])
+        self._compile_breakpoints()
+
+        # Sub-expression DAG: each distinct node is stored once, children
+        # before parents. Nodes are (OP_TERM, flat term, v) or (op, left, right).
+        self.nodes = []
+        node_ids = {}
+
+        def intern(node):
+            if node not in node_ids:
+                node_ids[node] = len(self.nodes)
+                self.nodes.append(node)
+            return node_ids[node]
+
+        self.rule_order, self.rule_consequents = [], []
+        self.rule_need, self.rule_var_leaves = [], []
+        self.dense_rules = []
+        self.index = [[] for _ in range(n_terms)]
+        for r, (program, consequent) in enumerate(engine.rules):
+            stack, order, leaves, and_only = [], [], set(), True
+            for op, v, t in program:
+                if op == OP_TERM:
+                    n = intern((OP_TERM, self.term_base[v] + t, v))
+                    leaves.add((v, self.term_base[v] + t))
+                elif op == OP_NOT:
+                    n = intern((OP_NOT, stack.pop(), None))
+                    and_only = False
+                else:
+                    b, a = stack.pop(), stack.pop()
+                    n = intern((op, a, b))
+                    and_only &= op == OP_AND
+                stack.append(n)
+                if n not in order:
+                    order.append(n)
+            self.rule_order.append(order)
+            self.rule_consequents.append(list(consequent))
+            # Distinct leaves, and how many of them each input contributes
+            # (a missing input drops its leaves from the conjunction)
+            self.rule_need.append(len(leaves))
+            var_leaves = {}
+            for v, _ in leaves:
+                var_leaves[v] = var_leaves.get(v, 0) + 1
+            self.rule_var_leaves.append(var_leaves)
+            if and_only:
+                for _, f in leaves:
+                    self.index[f].append(r)
+            else:
+                # OR / NOT can fire with every term at zero; always evaluate
+                self.dense_rules.append(r)
+        self._blank = [None] * len(self.nodes)
+        self._mu = [0.0] * n_terms
+        self._hits = [0] * len(engine.rules)
+        self._needs = {0: self.rule_need}
+
+    def _compile_breakpoints(self):
+        # Kinks that do not depend on the cut levels (universe bounds, term
+        # vertices, edge/edge crossings), sorted and clipped once for every
+        # subset of output terms, keyed by the bitmask of active terms
+        lo, hi = self.out_lo, self.out_hi
+        self.out_edges = [_edges(*p) for p in self.out_params]
+        term_points = []
+        for a, b, c in self.out_params:
+            points = [a, b, c]
+            if a == b:
+                points.append(math.nextafter(a, -math.inf))
+            if b == c:
+                points.append(math.nextafter(c, math.inf))
+            term_points.append(points)
+        pair_points = {}
+        for i in range(len(self.out_params)):
+            for j in range(i + 1, len(self.out_params)):
+                points = []
+                for m1, q1 in self.out_edges[i]:
+                    for m2, q2 in self.out_edges[j]:
+                        if m1 != m2:
+                            points.append((q2 - q1) / (m1 - m2))
+                pair_points[i, j] = points
+        self.fixed_points = []
+        for mask in range(1 << len(self.out_params)):
+            terms = [k for k in range(len(self.out_params)) if mask >> k & 1]
+            points = [lo, hi]
+            for i in terms:
+                points += term_points[i]
+                points += [p for j in terms if i < j for p in pair_points[i, j]]
+            self.fixed_points.append(sorted({lo if p < lo else hi if p > hi else p for p in points}))
+
+    def memberships(self, values):
+        # Fills the flat membership buffer; returns the active flat terms and
+        # the bitmask of missing inputs. The caller resets the active entries
+        # with _clear().
+        mu = self._mu
+        active, missing = [], 0
+        for v, x in enumerate(values):
+            if x is None or x != x:
+                missing |= 1 << v
+                continue
+            lo, hi = self.bounds[v]
+            x = lo if x < lo else hi if x > hi else x
+            for f, a, b, c in self.var_terms[v]:
+                mu_x = _tri(x, a, b, c)
+                if mu_x > 0.0:
+                    mu[f] = mu_x
+                    active.append(f)
+        return active, missing
+
+    def _clear(self, active):
+        mu = self._mu
+        for f in active:
+            mu[f] = 0.0
+
+    def _need(self, missing):
+        # Active leaves each rule needs to fire when the inputs in `missing`
+        # drop out; the few missing-input patterns a session has are cached
+        need = self._needs.get(missing)
+        if need is None:
+            need = [n - sum(c for v, c in var_leaves.items() if missing >> v & 1)
+                    for n, var_leaves in zip(self.rule_need, self.rule_var_leaves)]
+            self._needs[missing] = need
+        return need
+
+    def active_rules(self, active, missing):
+        # A conjunctive rule fires only if every term is active; a missing
+        # input drops its terms from the conjunction (fmin semantics).
+        hits, index, need = self._hits, self.index, self._need(missing)
+        touched = []
+        for f in active:
+            for r in index[f]:
+                if not hits[r]:
+                    touched.append(r)
+                hits[r] += 1
+        fired = []
+        for r in touched:
+            if hits[r] == need[r]:
+                fired.append(r)
+            hits[r] = 0
+        return fired + self.dense_rules
+
+    def firing(self, values):
+        # Per-output-term cuts, evaluating only the rules that can fire
+        active, missing = self.memberships(values)
+        mu, nodes = self._mu, self.nodes
+        vals = self._blank[:]
+        cuts = [0.0] * len(self.out_params)
+        for r in self.active_rules(active, missing):
+            for n in self.rule_order[r]:
+                if vals[n] is not None:
+                    continue
+                op, a, b = nodes[n]
+                if op == OP_TERM:
+                    vals[n] = math.nan if missing >> b & 1 else mu[a]
+                elif op == OP_AND:
+                    vals[n] = _fmin(vals[a], vals[b])
+                elif op == OP_OR:
+                    vals[n] = _fmax(vals[a], vals[b])
+                else:
+                    vals[n] = 1.0 - vals[a]
+            strength = vals[n]
+            if strength != strength:
+                continue
+            for k, weight in self.rule_consequents[r]:
+                if strength * weight > cuts[k]:
+                    cuts[k] = strength * weight
+        self._clear(active)
+        return cuts, missing == (1 << len(values)) - 1
+
+    def centroid(self, cuts):
+        # Exact centroid over the active output terms only. Kinks are the
+        # precomputed fixed points of the active set plus the points where
+        # an edge meets a cut level no higher than its own cut.
+        lo, hi = self.out_lo, self.out_hi
+        mask = 0
+        terms = []
+        for k, cut in enumerate(cuts):
+            if cut > 0.0:
+                mask |= 1 << k
+                terms.append(k)
+        if not mask:
+            return None
+
+        moving = []
+        for i in terms:
+            for j in terms:
+                if cuts[i] <= cuts[j]:
+                    for m, q in self.out_edges[j]:
+                        p = (cuts[i] - q) / m
+                        moving.append(lo if p < lo else hi if p > hi else p)
+        points = self.fixed_points[mask] + moving
+        points.sort()
+
+        shapes = [self.out_params[k] + (cuts[k],) for k in terms]
+        area = moment = 0.0
+        x1 = y1 = None
+        for x in points:
+            if x == x1:
+                continue
+            y = 0.0
+            for a, b, c, cut in shapes:
+                if x == b:
+                    mu = 1.0
+                elif a < x < b:
+                    mu = (x - a) / (b - a)
+                elif b < x < c:
+                    mu = (c - x) / (c - b)
+                else:
+                    continue
+                if mu > cut:
+                    mu = cut
+                if mu > y:
+                    y = mu
+            if x1 is not None and (y1 or y):
+                dx = x - x1
+                area += dx * (y1 + y) / 2.0
+                moment += dx * (x1 * (2 * y1 + y) + x * (y1 + 2 * y)) / 6.0
+            x1, y1 = x, y
+        return moment / area if area > 0.0 else None
+
+    def score(self, values):
+        # values: one sample in input_names order (None / NaN for missing).
+        # Returns the crisp safety score, or None when nothing fires.
+        cuts, all_missing = self.firing(values)
+        if all_missing:
+            return None
+        return self.centroid(cuts)
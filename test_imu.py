@@ -0,0 +1,32 @@
+import struct
+from fake_smbus import FakeSMBus
+from imu import MPU6050
+
+RAW = [(16384, -8192, 0, -11730, 131, -262, 32767), (-16384, 1, -1, 0, -131, 0, -32768)]
+FRAMES = [struct.pack('>7h', *s) for s in RAW]
+
+
+def test_burst_decode():
+    sensor = MPU6050(verbose=False, bus=FakeSMBus(FRAMES))
+    assert [sensor.read_burst() for _ in RAW] == RAW
+    data = sensor.get_motion_data()
+    assert data["accel"] == {'x': 1.0, 'y': -0.5, 'z': 0.0}
+    assert data["gyro"] == {'x': 1.0, 'y': -2.0, 'z': 32767 / 131.0}
+    assert abs(data["temp"] - (-11730 / 340.0 + 36.53)) < 1e-12
+
+
+def test_retry_on_io_error():
+    # Every failed read is retried on the same frame, so nothing is skipped
+    bus = FakeSMBus(FRAMES * 500, fail_rate=0.3, seed=1)
+    sensor = MPU6050(verbose=False, bus=bus, retries=10)
+    for i in range(1000):
+        assert sensor.read_burst() == RAW[i % 2]
+    assert bus.failures > 0
+    assert sensor.retried == bus.failures
+
+
+def test_retries_exhausted():
+    sensor = MPU6050(verbose=False, bus=FakeSMBus(FRAMES, fail_rate=1.0), retries=2)
+    data = sensor.get_motion_data()
+    assert data["status"] == 500
+    assert sensor.retried == 2
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+AGGREGATIONS = ('max', 'mean', 'min', 'first', 'last')
+
+
+def parse_obd_time(parsed_time, clock='hms'):
+    # OBD exports carry a clock without a date ('28:44:00'). 'hms' reads it
+    # as hours:minutes:seconds (one row per minute in the sample logs); 'ms'
+    # reads the first two fields as minutes:seconds for exports that were
+    # written that way. Returns seconds as float.
+    parts = parsed_time.astype(str).str.split(':', expand=True).astype(float)
+    if clock == 'hms':
+        return (parts[0] * 3600 + parts[1] * 60 + parts[2]).to_numpy()
+    elif clock == 'ms':
+        return (parts[0] * 60 + parts[1]).to_numpy()
+    raise ValueError(f"Unknown OBD clock '{clock}', expected 'hms' or 'ms'")
+
+
+def parse_imu_time(timestamp):
+    # ISO timestamps written by imu.py -> seconds as float
+    ns = pd.to_datetime(timestamp).to_numpy().astype('datetime64[ns]').astype(np.int64)
+    return ns / 1e9
+
+
+def _check_sorted(t, name):
+    if len(t) > 1 and np.any(np.diff(t) < 0):
+        raise ValueError(f"{name} timestamps must be sorted")
+
+
+def window_edges(ticks):
+    # Each tick owns [t_i, t_i+1); the last window is as long as the median step
+    step = np.median(np.diff(ticks)) if len(ticks) > 1 else 1.0
+    return np.append(ticks, ticks[-1] + step)
+
+
+def aggregate_to_ticks(ticks, t_src, values, how='max', tolerance=None):
+    # Reduce every source sample into the window of the tick it falls in.
+    # Both time arrays must be sorted, so the window boundaries come from one
+    # searchsorted pass and the reduction from one reduceat pass. Empty
+    # windows take the nearest source sample within `tolerance` seconds
+    # (NaN when there is none, or when tolerance is None).
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{how}', expected one of {AGGREGATIONS}")
+    ticks = np.asarray(ticks, dtype=float)
+    t_src = np.asarray(t_src, dtype=float)
+    values = np.asarray(values, dtype=float)
+    _check_sorted(ticks, "Target")
+    _check_sorted(t_src, "Source")
+
+    out = np.full(len(ticks), np.nan)
+    if len(ticks) == 0 or len(t_src) == 0:
+        return out
+
+    bounds = np.searchsorted(t_src, window_edges(ticks), side='left')
+    starts, stops = bounds[:-1], bounds[1:]
+    filled = stops > starts
+    if filled.any():
+        idx = starts[filled]
+        if how == 'max':
+            out[filled] = _reduce(np.fmax, values, starts, stops, filled)
+        elif how == 'min':
+            out[filled] = _reduce(np.fmin, values, starts, stops, filled)
+        elif how == 'mean':
+            csum = np.concatenate([[0.0], np.cumsum(np.nan_to_num(values))])
+            count = np.concatenate([[0], np.cumsum(~np.isnan(values))])
+            n = count[stops[filled]] - count[idx]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[filled] = np.where(n > 0, (csum[stops[filled]] - csum[idx]) / n, np.nan)
+        elif how == 'first':
+            out[filled] = values[idx]
+        else:
+            out[filled] = values[stops[filled] - 1]
+
+    if tolerance is not None and (~filled).any():
+        empty = np.nonzero(~filled)[0]
+        out[empty] = nearest(ticks[empty], t_src, values, tolerance)
+    return out
+
+
+def _reduce(ufunc, values, starts, stops, filled):
+    # ufunc.reduceat over the non-empty [start, stop) windows. Passing start
+    # and stop pairs makes every even segment one window; the odd segments
+    # (gaps between windows) are dropped. The NaN pad keeps stop == len valid.
+    idx = np.stack([starts[filled], stops[filled]], axis=1).ravel()
+    padded = np.append(values, np.nan)
+    return ufunc.reduceat(padded, idx)[::2]
+
+
+def nearest(ticks, t_src, values, tolerance):
+    # Value of the closest source sample within tolerance, else NaN
+    pos = np.searchsorted(t_src, ticks)
+    left = np.clip(pos - 1, 0, len(t_src) - 1)
+    right = np.clip(pos, 0, len(t_src) - 1)
+    pick = np.where(np.abs(t_src[right] - ticks) < np.abs(ticks - t_src[left]), right, left)
+    out = values[pick].astype(float)
+    out[np.abs(t_src[pick] - ticks) > tolerance] = np.nan
+    return out
+
+
+def interpolate_to_ticks(ticks, t_src, values, tolerance=None):
+    # Linear interpolation of a sorted source series onto sorted ticks. NaN
+    # source samples are skipped; ticks whose bracketing samples are more
+    # than `tolerance` seconds apart, or that lie outside the source span,
+    # come back NaN.
+    ticks = np.asarray(ticks, dtype=float)
+    t_src = np.asarray(t_src, dtype=float)
+    values = np.asarray(values, dtype=float)
+    _check_sorted(ticks, "Target")
+    _check_sorted(t_src, "Source")
+
+    ok = ~np.isnan(values)
+    t_ok, v_ok = t_src[ok], values[ok]
+    out = np.full(len(ticks), np.nan)
+    if len(t_ok) == 0:
+        return out
+
+    inside = (ticks >= t_ok[0]) & (ticks <= t_ok[-1])
+    out[inside] = np.interp(ticks[inside], t_ok, v_ok)
+    if tolerance is not None and len(t_ok) > 1:
+        pos = np.clip(np.searchsorted(t_ok, ticks, side='right'), 1, len(t_ok) - 1)
+        gap = t_ok[pos] - t_ok[pos - 1]
+        exact = t_ok[pos - 1] == ticks
+        out[(gap > tolerance) & ~exact] = np.nan
+    return out
+
+
+def align_session(obd_df, imu_df, rate='obd', how='max', tolerance=None, offset=0.0, clock='hms',
+                  obd_columns=None):
+    # Puts OBD values and IMU lean on one clock. Both logs are measured from
+    # their own first sample; `offset` is the IMU start minus the OBD start
+    # in seconds.
+    #   rate='obd': lean aggregated (`how`) over each OBD interval
+    #   rate='imu': OBD channels interpolated onto every IMU tick
+    # tolerance defaults to 1.5x the median step of the coarser stream.
+    if 'lean' not in imu_df:
+        raise ValueError("imu_df needs a 'lean' column")
+    t_obd = parse_obd_time(obd_df['parsed_time'], clock)
+    t_obd = t_obd - t_obd[0]
+    t_imu = parse_imu_time(imu_df['timestamp'])
+    t_imu = t_imu - t_imu[0] + offset
+    obd_columns = obd_columns or [c for c in obd_df.columns if c != 'parsed_time']
+
+    if tolerance is None:
+        steps = [np.median(np.diff(t)) for t in (t_obd, t_imu) if len(t) > 1]
+        tolerance = 1.5 * max(steps) if steps else 0.0
+
+    if rate == 'obd':
+        out = obd_df[obd_columns].reset_index(drop=True).copy()
+        out['lean'] = aggregate_to_ticks(t_obd, t_imu, imu_df['lean'].to_numpy(), how=how, tolerance=tolerance)
+        out.insert(0, 'elapsed_s', t_obd)
+    elif rate == 'imu':
+        out = pd.DataFrame({'elapsed_s': t_imu})
+        for c in obd_columns:
+            if pd.api.types.is_numeric_dtype(obd_df[c]):
+                out[c] = interpolate_to_ticks(t_imu, t_obd, obd_df[c].to_numpy(dtype=float), tolerance)
+        out['lean'] = imu_df['lean'].to_numpy()
+    else:
+        raise ValueError(f"Unknown rate '{rate}', expected 'obd' or 'imu'")
+    return out